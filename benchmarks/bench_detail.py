@@ -0,0 +1,44 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark the detail levels of PyPosAST
+
+Usage: python benchmarks/bench_detail.py [python files]
+Defaults to the modules of the standard library that define ast and typing
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+from pyposast.visitor import DETAIL_LEVELS
+
+
+def main():
+    paths = sys.argv[1:] or [ast.__file__, os.path.join(
+        os.path.dirname(ast.__file__), "typing.py"
+    )]
+    for path in paths:
+        with open(path, "rb") as source:
+            code = source.read()
+        print(path)
+        full = None
+        for level in reversed(DETAIL_LEVELS):
+            best = min(timeit.repeat(
+                lambda: pyposast.parse(code, path, detail=level),
+                number=1, repeat=5
+            ))
+            full = full or best
+            print("  {}: {:.3f}s ({:.1f}% faster than full)".format(
+                level, best, 100 * (full - best) / full
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark dump/load against a full PyPosAST parse
+
+Usage: python benchmarks/bench_dump.py [python files]
+Defaults to the modules of the standard library that define ast and typing
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import ast
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+
+def main():
+    paths = sys.argv[1:] or [ast.__file__, os.path.join(
+        os.path.dirname(ast.__file__), "typing.py"
+    )]
+    sys.setrecursionlimit(10000)
+    for path in paths:
+        with open(path, "rb") as source:
+            code = source.read()
+        tree = pyposast.parse(code, path)
+        data = pyposast.dump(tree)
+        print(path)
+        print("  dump: {} bytes, pickle: {} bytes".format(
+            len(data), len(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        ))
+        for name, function in (
+                ("parse", lambda: pyposast.parse(code, path)),
+                ("load", lambda: pyposast.load(data, code, filename=path))):
+            best = min(timeit.repeat(function, number=1, repeat=5))
+            print("  {}: {:.3f}s".format(name, best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark f-string heavy logging code
+
+Usage: python benchmarks/bench_fstring.py [number of statements]
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+from pyposast.parser import extract_tokens
+
+
+def logging_code(statements):
+    """Generate logging calls with many (and nested) f-string fields"""
+    lines = ["import logging", "log = logging.getLogger(__name__)"]
+    for i in range(statements):
+        lines.append(
+            "log.info(f'request={req.id!r} user={user.name:>{width}} "
+            "path={req.path} took={elapsed:.3f}s items={len(items)} "
+            "first={items[0] if items else None} "
+            "nested={f\"{a.b[%d]}-{c!s}\"} total={a + b * %d:08d}')" % (i, i)
+        )
+    return "\n".join(lines) + "\n"
+
+
+def wide_logging_code(statements, fields=50):
+    """Generate logging calls with a single long f-string each"""
+    lines = ["import logging", "log = logging.getLogger(__name__)"]
+    for i in range(statements):
+        lines.append("log.debug(f'" + " ".join(
+            "k{0}={{v{0}.x!r:>{{w{0}}}.{{p{0}}}}}".format(j)
+            for j in range(fields)
+        ) + "')")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for kind, generate in (("short", logging_code), ("wide", wide_logging_code)):
+        code = generate(statements)
+        for name, function in (("extract_tokens", extract_tokens),
+                               ("parse", pyposast.parse)):
+            best = min(timeit.repeat(
+                lambda: function(code), number=1, repeat=5
+            ))
+            print("{} {}: {} statements, {:.3f}s".format(
+                kind, name, statements, best
+            ))
+
+
+if __name__ == "__main__":
+    main()
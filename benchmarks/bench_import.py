@@ -0,0 +1,48 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark the import time of PyPosAST
+
+Usage: python benchmarks/bench_import.py
+Each statement runs in a fresh interpreter
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    "pass",
+    "import pyposast",
+    "from pyposast.client import Client",
+    "import pyposast; pyposast.parse('a = 1')",
+]
+
+
+def run(statement):
+    """Run statement in a new interpreter that can import PyPosAST"""
+    subprocess.check_call(
+        [sys.executable, "-c", "import sys; sys.path.insert(0, {!r}); {}"
+         .format(ROOT, statement)]
+    )
+
+
+def main():
+    baseline = None
+    for statement in STATEMENTS:
+        best = min(timeit.repeat(
+            lambda: run(statement), number=1, repeat=10
+        ))
+        if baseline is None:
+            baseline = best
+            print("interpreter startup: {:.1f}ms".format(1000 * best))
+        else:
+            print("{}: {:.1f}ms".format(statement, 1000 * (best - baseline)))
+
+
+if __name__ == "__main__":
+    main()
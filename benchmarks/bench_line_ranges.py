@@ -0,0 +1,41 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark range-restricted annotation against a full PyPosAST parse
+
+Usage: python benchmarks/bench_line_ranges.py [python files]
+Defaults to the modules of the standard library that define ast and typing.
+The range is a small hunk in the middle of each file
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import ast
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+
+def main():
+    paths = sys.argv[1:] or [ast.__file__, os.path.join(
+        os.path.dirname(ast.__file__), "typing.py"
+    )]
+    for path in paths:
+        with open(path, "rb") as source:
+            code = source.read()
+        middle = code.count(b"\n") // 2
+        line_ranges = [(middle, middle + 3)]
+        print(path, line_ranges)
+        for name, function in (
+                ("parse", lambda: pyposast.parse(code, path)),
+                ("line_ranges", lambda: pyposast.parse(
+                    code, path, line_ranges=line_ranges))):
+            best = min(timeit.repeat(function, number=1, repeat=5))
+            print("  {}: {:.3f}s".format(name, best))
+
+
+if __name__ == "__main__":
+    main()
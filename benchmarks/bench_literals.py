@@ -0,0 +1,56 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark PyPosAST on a generated data module with large literals
+
+Usage: python benchmarks/bench_literals.py [megabytes]
+The module has a dict of tuples of constants and a flat list of numbers
+and strings. Default size: 50 MB
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+
+def generate(size):
+    """Generate a data module with about size bytes"""
+    lines = ["RECORDS = {"]
+    total, index = 0, 0
+    while total < size // 2:
+        line = "    'key{0}': ({0}, {0}.5, 'value {0}', None, True),".format(index)
+        lines.append(line)
+        total += len(line) + 1
+        index += 1
+    lines.append("}")
+    lines.append("VALUES = [")
+    while total < size:
+        line = "    {0}, 'item{0}', {0}e-3, b'{0}',".format(index)
+        lines.append(line)
+        total += len(line) + 1
+        index += 1
+    lines.append("]")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    code = generate(int(megabytes * 1024 * 1024))
+    print("{:.1f} MB, {} lines".format(
+        len(code) / 1024 / 1024, code.count("\n")
+    ))
+    best = min(timeit.repeat(
+        lambda: pyposast.parse(code), number=1, repeat=1 if megabytes > 5 else 3
+    ))
+    print("  parse: {:.3f}s ({:.2f} MB/s)".format(
+        best, len(code) / 1024 / 1024 / best
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark the resolution of uids with and without NodeIndex
+
+Usage: python benchmarks/bench_node_index.py [python file] [events]
+Defaults to the module of the standard library that defines typing and
+100000 events
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import ast
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+
+def walk_lookup(tree, uid):
+    """Find the nodes with a uid by walking the tree"""
+    return [
+        node for node in ast.walk(tree)
+        if getattr(node, 'uid', None) == uid
+    ]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(ast.__file__), "typing.py"
+    )
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    with open(path, "rb") as source:
+        code = source.read()
+    for node_index in (False, True):
+        best = min(timeit.repeat(
+            lambda: pyposast.parse(code, path, node_index=node_index),
+            number=1, repeat=5
+        ))
+        print("parse (node_index={}): {:.3f}s".format(node_index, best))
+
+    tree = pyposast.parse(code, path, node_index=True)
+    random.seed(0)
+    uids = random.sample(sorted(tree.node_index.uids), 100)
+    walk = min(timeit.repeat(
+        lambda: [walk_lookup(tree, uid) for uid in uids], number=1, repeat=3
+    )) / len(uids)
+    print("walk: {:.3f}ms per event".format(1000 * walk))
+    uids = [random.choice(uids) for _ in range(events)]
+    index = min(timeit.repeat(
+        lambda: [tree.node_index.nodes_at(uid) for uid in uids],
+        number=1, repeat=5
+    ))
+    print("node_index: {:.3f}s for {} events ({:.2f}us per event)".format(
+        index, events, 1e6 * index / events
+    ))
+
+
+if __name__ == "__main__":
+    main()
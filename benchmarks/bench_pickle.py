@@ -0,0 +1,57 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Benchmark pickling trees parsed by PyPosAST with and without the
+registered copyreg reducers
+
+Usage: python benchmarks/bench_pickle.py [python files]
+Defaults to the modules of the standard library that define ast and typing
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import ast
+import io
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyposast
+
+
+def dumps(tree, dispatch_table=None):
+    """Pickle tree. Use the default reducers if dispatch_table is empty"""
+    output = io.BytesIO()
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    if dispatch_table is not None:
+        pickler.dispatch_table = dispatch_table
+    pickler.dump(tree)
+    return output.getvalue()
+
+
+def main():
+    paths = sys.argv[1:] or [ast.__file__, os.path.join(
+        os.path.dirname(ast.__file__), "typing.py"
+    )]
+    sys.setrecursionlimit(10000)
+    for path in paths:
+        with open(path, "rb") as source:
+            tree = pyposast.parse(source.read(), path)
+        print(path)
+        for name, table in (("default", {}), ("reducers", None)):
+            data = dumps(tree, table)
+            dump = min(timeit.repeat(
+                lambda: dumps(tree, table), number=1, repeat=10
+            ))
+            load = min(timeit.repeat(
+                lambda: pickle.loads(data), number=1, repeat=10
+            ))
+            print("  {}: {} bytes, dumps {:.3f}s, loads {:.3f}s".format(
+                name, len(data), dump, load
+            ))
+
+
+if __name__ == "__main__":
+    main()
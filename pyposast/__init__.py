@@ -1,12 +1,47 @@
 # Copyright (c) 2016 Universidade Federal Fluminense (UFF)
 # This file is part of PyPosAST.
 # Please, consult the license terms in the LICENSE file.
-"""PyPosAST Module"""
+"""PyPosAST Module
+Submodules are imported on first use, which keeps the import of pyposast
+(and of pyposast.client) cheap
+"""
 from __future__ import (absolute_import, division)
 
 import ast
-from .visitor import LineProvenanceVisitor as Visitor, extract_code
-from .cross_version import native_decode_source, decode_source_to_unicode
+import os
+import sys
+
+from importlib import import_module
+
+
+# Names imported from submodules on first access: name -> (module, name)
+LAZY_NAMES = {
+    'Visitor': ('visitor', 'LineProvenanceVisitor'),
+    'extract_code': ('visitor', 'extract_code'),
+    'native_decode_source': ('cross_version', 'native_decode_source'),
+    'decode_source_to_unicode': ('cross_version', 'decode_source_to_unicode'),
+    'dump': ('serialization', 'dump'),
+    'load': ('serialization', 'load'),
+}
+
+
+def __getattr__(name):
+    """Import lazy names (PEP 562)"""
+    try:
+        module, attribute = LAZY_NAMES[name]
+    except KeyError:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name)
+        )
+    value = getattr(import_module('.' + module, __name__), attribute)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info < (3, 7):
+    # Modules do not support __getattr__
+    for _name in LAZY_NAMES:
+        __getattr__(_name)
 
 
 def parse(code, filename='<unknown>', mode='exec', tree=None, **parse_args):
@@ -22,11 +57,173 @@ def parse(code, filename='<unknown>', mode='exec', tree=None, **parse_args):
     filename -- code path
     mode -- execution mode (exec, eval, single)
     tree -- current tree, if it was optimized
+
+    Other keyword arguments of LineProvenanceVisitor:
+    start -- (line, col) of the first character of code in a host file.
+             Positions are moved to the host file. Default: (1, 0)
+    line_ranges -- (first, last) lines. Only annotate the top-level
+                   statements that overlap them
+    time_limit -- seconds before falling back to CPython positions
+    node_limit -- number of nodes above which CPython positions are used.
+                  Before Python 3.8, CPython has no end positions, so the
+                  fallback extents of leaves have zero width
+    threads -- visit top-level statements with a pool of threads
+    detail -- 'full' (default), 'uid' or 'extents'. Lighter levels leave
+              out op_pos and other auxiliary positions. 'extents' also
+              leaves out uid
+    node_index -- build a NodeIndex of uids and extents (tree.node_index)
+    comments -- attach comments to nodes (leading_comments and
+                trailing_comment)
     """
-    visitor = Visitor(code, filename, mode, tree=tree, **parse_args)
+    from .visitor import LineProvenanceVisitor
+    visitor = LineProvenanceVisitor(
+        code, filename, mode, tree=tree, **parse_args
+    )
     return visitor.tree
 
 
+def parse_file(path, mode='exec', tree=None, **parse_args):
+    """Parse a file into an AST node with PyPosAST.
+    Enhance nodes with positions
+    The file is memory-mapped and decoded directly from the mapped buffer.
+    Only its first two lines are read to detect the encoding
+
+
+    Arguments:
+    path -- code path
+
+
+    Keyword Arguments:
+    mode -- execution mode (exec, eval, single)
+    tree -- current tree, if it was optimized
+    """
+    import mmap
+    from .cross_version import decode_source_to_unicode
+    with open(path, 'rb') as source:
+        if not os.fstat(source.fileno()).st_size:
+            return parse(b'', path, mode, tree, **parse_args)
+        buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        code = decode_source_to_unicode(buffer)
+    finally:
+        buffer.close()
+    return parse(code, path, mode, tree, **parse_args)
+
+
+def _find_magic(lines):
+    """Return (line, col, assignment) of the first IPython magic or shell
+    command of a cell, or None. Magics (%, %% and !) start a logical line
+    outside brackets or follow the = of an assignment (x = !ls)
+
+    Arguments:
+    lines -- cell lines, with line breaks
+    """
+    import functools
+    import tokenize
+    readline = functools.partial(next, iter(lines), '')
+    depth, start, previous = 0, True, None
+    try:
+        for tok in tokenize.generate_tokens(readline):
+            t_type, t_string, (row, col) = tok[:3]
+            if t_type in (tokenize.NEWLINE, tokenize.NL):
+                if not depth:
+                    start, previous = True, None
+                continue
+            if t_type in (tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT):
+                continue
+            if t_type == tokenize.ERRORTOKEN and not t_string.strip():
+                # Whitespace before a ! (Python < 3.12)
+                continue
+            if t_string in ('%', '!') and (
+                    start or (not depth and previous == '=')):
+                return row, col, not start
+            if t_type == tokenize.OP and t_string in ('(', '[', '{'):
+                depth += 1
+            elif t_type == tokenize.OP and t_string in (')', ']', '}'):
+                depth -= 1
+            start, previous = False, t_string
+    except (tokenize.TokenError, SyntaxError):
+        # The cell is invalid after the last magic. parse reports it
+        pass
+    return None
+
+
+def notebook_cells(notebook):
+    """Return (cell index, code) of the code cells of a notebook (nbformat 4)
+    IPython magics and shell commands are commented out, keeping positions
+    Assignments of magics (x = !ls) assign None
+    """
+    result = []
+    for index, cell in enumerate(notebook.get('cells', [])):
+        if cell.get('cell_type') != 'code':
+            continue
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        lines = source.splitlines(True)
+        magic = _find_magic(lines)
+        while magic is not None:
+            row, col, assignment = magic
+            line = lines[row - 1]
+            lines[row - 1] = (
+                line[:col] + ('None #' if assignment else '#') + line[col + 1:]
+            )
+            magic = _find_magic(lines)
+        result.append((index, ''.join(lines)))
+    return result
+
+
+def parse_notebook(path, mode='exec', **parse_args):
+    """Parse all code cells of a Jupyter notebook (.ipynb) with PyPosAST
+    Return a list of (cell index, tree, error). Tree is None if the cell
+    could not be parsed or annotated. Positions are relative to each cell
+
+
+    Arguments:
+    path -- notebook path
+
+
+    Keyword Arguments:
+    mode -- execution mode (exec, eval, single)
+    """
+    import json
+    with open(path, 'rb') as source:
+        notebook = json.loads(source.read().decode('utf-8'))
+    result = []
+    for index, code in notebook_cells(notebook):
+        filename = '{}[{}]'.format(path, index)
+        try:
+            tree = parse(code, filename, mode, **parse_args)
+        except Exception as error:  # pylint: disable=broad-except
+            # Visitor crashes are reported as errors of the cell
+            result.append((index, None, error))
+        else:
+            result.append((index, tree, None))
+    return result
+
+
+def positions(code, filename='<unknown>', mode='exec', tree=None,
+              **parse_args):
+    """Find the positions of the nodes of a tree without modifying it.
+    Return a PositionTable that maps node ids (or nodes) to positions
+
+
+    Arguments:
+    code -- code text
+
+
+    Keyword Arguments:
+    filename -- code path
+    mode -- execution mode (exec, eval, single)
+    tree -- current tree. It may be shared with other threads
+    """
+    from .visitor import LineProvenanceVisitor
+    visitor = LineProvenanceVisitor(
+        code, filename, mode, tree=tree, side_table=True, **parse_args
+    )
+    return visitor.table
+
+
 class _GetVisitor(ast.NodeVisitor):
     """Visit nodes and store them in .result if they match the given type"""
 
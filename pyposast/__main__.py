@@ -0,0 +1,79 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Index the positions of .py files: python -m pyposast [paths]
+Find the occurrences of a name in the index: python -m pyposast --find name
+Or run an annotation server: python -m pyposast --serve socket
+"""
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+
+from .index import Index
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='pyposast',
+        description='Annotate .py files with PyPosAST and store node '
+                    'positions in a SQLite index. Only changed files are '
+                    'annotated again')
+    parser.add_argument('paths', nargs='*', default=['.'],
+                        help='directories or files (default: .)')
+    parser.add_argument('-o', '--output', default='pyposast.sqlite',
+                        help='index database (default: pyposast.sqlite)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: CPUs)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print the summary')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='seconds per file before falling back to '
+                             'CPython positions')
+    parser.add_argument('--node-limit', type=int, default=None,
+                        help='number of nodes per file above which CPython '
+                             'positions are used')
+    parser.add_argument('--find', metavar='NAME',
+                        help='print the indexed occurrences of an identifier '
+                             'as path:line:col instead of indexing paths')
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help='run an annotation server on a Unix-domain '
+                             'socket instead of indexing paths')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='files kept in memory by the server '
+                             '(default: 256)')
+    options = parser.parse_args(args)
+
+    if options.serve:
+        from .server import serve
+        serve(options.serve, jobs=options.jobs, cache_size=options.cache_size)
+        return 0
+
+    if options.find:
+        index = Index(options.output)
+        try:
+            occurrences = index.occurrences(options.find)
+        finally:
+            index.close()
+        for path, (line, col), _ in occurrences:
+            print('{}:{}:{}'.format(path, line, col))
+        return 0
+
+    index = Index(options.output)
+    try:
+        summary = index.update(
+            options.paths, jobs=options.jobs, time_limit=options.time_limit,
+            node_limit=options.node_limit
+        )
+        degraded = index.degraded()
+    finally:
+        index.close()
+    if not options.quiet:
+        print('{indexed} indexed, {unchanged} unchanged, {removed} removed, '
+              '{errors} errors, {degraded} degraded'.format(**summary))
+        for path, reason in degraded:
+            print('degraded ({}): {}'.format(reason, path))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""asyncio API. Annotation runs in an executor, outside the event loop
+
+Cancelling a coroutine before its annotation starts removes it from the
+executor. An annotation that already started runs to the end in its
+worker, but its result is discarded
+"""
+from __future__ import (absolute_import, division)
+
+import asyncio
+import functools
+
+from . import parse, parse_file, get_nodes
+
+try:
+    get_running_loop = asyncio.get_running_loop
+except AttributeError:  # Python 3.6
+    get_running_loop = asyncio.get_event_loop
+
+
+async def _run(function, args, kwargs, executor, semaphore):
+    """Run function in executor, holding semaphore if it is not None"""
+    loop = get_running_loop()
+    call = functools.partial(function, *args, **kwargs)
+    if semaphore is None:
+        return await loop.run_in_executor(executor, call)
+    async with semaphore:
+        return await loop.run_in_executor(executor, call)
+
+
+async def parse_async(code, filename='<unknown>', mode='exec', tree=None,
+                      executor=None, semaphore=None, **parse_args):
+    """Coroutine version of pyposast.parse
+
+
+    Arguments:
+    code -- code text
+
+
+    Keyword Arguments:
+    filename -- code path
+    mode -- execution mode (exec, eval, single)
+    tree -- current tree, if it was optimized
+    executor -- thread or process pool. Default: loop default executor
+    semaphore -- asyncio.Semaphore that bounds concurrent annotations
+    """
+    return await _run(
+        parse, (code, filename, mode, tree), parse_args, executor, semaphore
+    )
+
+
+async def get_nodes_async(code, desired_type, path="__main__", mode="exec",
+                          tree=None, executor=None, semaphore=None,
+                          **parse_args):
+    """Coroutine version of pyposast.get_nodes
+
+
+    Arguments:
+    code -- code text
+    desired_type -- ast Node or tuple
+
+
+    Keyword Arguments:
+    path -- code path
+    mode -- execution mode (exec, eval, single)
+    tree -- current tree, if it was optimized
+    executor -- thread or process pool. Default: loop default executor
+    semaphore -- asyncio.Semaphore that bounds concurrent annotations
+    """
+    return await _run(
+        get_nodes, (code, desired_type, path, mode, tree), parse_args,
+        executor, semaphore
+    )
+
+
+async def parse_files_async(paths, mode='exec', executor=None, concurrency=8,
+                            **parse_args):
+    """Parse files with pyposast.parse_file
+    Yield (path, tree, error) in completion order. Tree is None if the
+    file could not be parsed or annotated. Closing the iterator cancels
+    pending files
+
+
+    Arguments:
+    paths -- file paths
+
+
+    Keyword Arguments:
+    mode -- execution mode (exec, eval, single)
+    executor -- thread or process pool. Default: loop default executor
+    concurrency -- maximum number of files annotated at once
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def annotate(path):
+        try:
+            tree = await _run(
+                parse_file, (path, mode), parse_args, executor, semaphore
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            # A visitor crash on one file must not stop the others
+            return path, None, error
+        return path, tree, None
+
+    tasks = [asyncio.ensure_future(annotate(path)) for path in paths]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
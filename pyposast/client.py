@@ -0,0 +1,98 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Client of the PyPosAST annotation server (pyposast.server)
+
+Messages are JSON objects prefixed by their length (4 bytes, big endian).
+Node rows are lists of (node_id, type, first_line, first_col, last_line,
+last_col, uid_line, uid_col)
+"""
+from __future__ import (absolute_import, division)
+
+import json
+import os
+import socket
+import struct
+
+
+LENGTH = struct.Struct('>I')
+
+
+class ServerError(Exception):
+    """Error reported by the annotation server"""
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, message):
+    """Send a length-prefixed JSON message"""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+
+def receive_message(sock):
+    """Receive a length-prefixed JSON message. Return None on EOF"""
+    header = _receive_exactly(sock, LENGTH.size)
+    if header is None:
+        return None
+    data = _receive_exactly(sock, LENGTH.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+class Client(object):
+    """Connection to a PyPosAST annotation server"""
+
+    def __init__(self, address):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(address)
+
+    def close(self):
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def request(self, command, **arguments):
+        """Send a request and return its result"""
+        arguments['command'] = command
+        send_message(self.socket, arguments)
+        response = receive_message(self.socket)
+        if response is None:
+            raise ServerError("Connection closed by the server")
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response['result']
+
+    def nodes(self, path, node_type=None):
+        """Return the rows of nodes of a file, optionally of a single type"""
+        return self.request(
+            'nodes', path=os.path.abspath(path), type=node_type
+        )
+
+    def node_at(self, path, line, col):
+        """Return the row of the innermost node at line:col, or None"""
+        return self.request(
+            'node_at', path=os.path.abspath(path), line=line, col=col
+        )
+
+    def stats(self):
+        """Return cache statistics of the server"""
+        return self.request('stats')
+
+    def shutdown(self):
+        """Stop the server"""
+        return self.request('shutdown')
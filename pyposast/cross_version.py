@@ -2,28 +2,34 @@
 # This file is part of PyPosAST.
 # Please, consult the license terms in the LICENSE file.
 
+import codecs
 import sys
 
-try:
-    from cStringIO import StringIO
-except ImportError:
+if sys.version_info >= (3, 0):
     from io import StringIO
+else:
+    from cStringIO import StringIO
 
 
 class SelectVersion(object):
+    """Version condition. The version is compared once, on creation
+    Decorated functions are kept as they are if the condition holds, and
+    replaced by a function that returns None otherwise
+    """
 
     def __init__(self, compare_func):
-        self.compare_func = compare_func
+        self.selected = bool(compare_func(sys.version_info))
 
     def __call__(self, fn):
+        if self.selected:
+            return fn
+
         def inner(*args, **kwargs):
-            if self.compare_func(sys.version_info):
-                return fn(*args, **kwargs)
             return None
         return inner
 
     def __bool__(self):
-        return self.compare_func(sys.version_info)
+        return self.selected
 
     def __nonzero__(self):
         return self.__bool__()
@@ -140,9 +146,24 @@ if only_python2:
     readlines = lambda seq: iter(seq).next
 
 
+def first_lines(source_bytes, count=2):
+    """Return the first lines of bytes or of a mapped buffer
+    The encoding cookie can only appear in the first two lines
+    """
+    lines = []
+    start = 0
+    size = len(source_bytes)
+    while len(lines) < count and start < size:
+        end = source_bytes.find(b'\n', start) + 1 or size
+        lines.append(source_bytes[start:end])
+        start = end
+    return lines
+
+
 def decode_source_to_unicode(source_bytes):
-    encoding = detect_encoding(readlines(source_bytes.splitlines(True)))
-    return source_bytes.decode(encoding[0], 'replace')
+    """Decode bytes or a mapped buffer with the codec specified in the file"""
+    encoding = detect_encoding(readlines(first_lines(source_bytes)))
+    return codecs.decode(source_bytes, encoding[0], 'replace')
 
 
 def native_decode_source(text):
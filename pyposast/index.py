@@ -0,0 +1,325 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Persistent SQLite index of node positions and name occurrences
+
+Each file is stored with its mtime, size and sha1 hash. Files are only
+annotated again when they change
+"""
+from __future__ import (absolute_import, division)
+
+import functools
+import hashlib
+import keyword
+import os
+import sqlite3
+
+from .parser import extract_tokens
+from .utils import BudgetExceeded
+from .visitor import LineProvenanceVisitor
+from .serialization import dump
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    hash TEXT,
+    positions BLOB,
+    error TEXT,
+    degraded TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT,
+    node_id INTEGER,
+    type TEXT,
+    first_line INTEGER,
+    first_col INTEGER,
+    last_line INTEGER,
+    last_col INTEGER,
+    uid_line INTEGER,
+    uid_col INTEGER,
+    PRIMARY KEY (path, node_id)
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT,
+    path TEXT,
+    first_line INTEGER,
+    first_col INTEGER,
+    last_line INTEGER,
+    last_col INTEGER,
+    PRIMARY KEY (name, path, first_line, first_col)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS names_path ON names (path);
+"""
+
+
+def find_files(paths):
+    """Find .py files in paths. Return sorted absolute paths"""
+    result = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            result.add(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            result.update(
+                os.path.join(root, name) for name in files
+                if name.endswith('.py')
+            )
+    return sorted(result)
+
+
+def node_rows(nodes):
+    """Return (node_id, type, first_line, first_col, last_line, last_col,
+    uid_line, uid_col) of nodes numbered by number_nodes
+    Positions are None for nodes without positions
+    """
+    rows = []
+    for node in nodes:
+        uid = getattr(node, 'uid', (None, None))
+        rows.append((
+            node.node_id, type(node).__name__,
+            getattr(node, 'first_line', None), getattr(node, 'first_col', None),
+            getattr(node, 'last_line', None), getattr(node, 'last_col', None),
+            uid[0], uid[1],
+        ))
+    return rows
+
+
+def name_rows(names):
+    """Return (name, first_line, first_col, last_line, last_col) of the
+    identifier tokens of a visitor (LineProvenanceVisitor.names)
+    Keywords are skipped
+    """
+    rows = []
+    for name, positions in names.items():
+        if keyword.iskeyword(name):
+            continue
+        rows.extend(
+            (name,) + first + last for last, first in positions.items()
+        )
+    return rows
+
+
+def annotate_file(item, time_limit=None, node_limit=None):
+    """Annotate a file. Used by worker processes
+
+    Arguments:
+    item -- (path, mtime, size, hash, code)
+
+    Keyword Arguments:
+    time_limit -- seconds before falling back to CPython positions
+    node_limit -- number of nodes above which CPython positions are used
+
+    Return (path, mtime, size, hash, dump, node rows, name rows, error,
+            degraded)
+    """
+    path, mtime, size, digest, code = item
+    try:
+        visitor = LineProvenanceVisitor(
+            code, path, time_limit=time_limit, node_limit=node_limit
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        # A file that the visitor cannot annotate must not stop the batch
+        return path, mtime, size, digest, None, [], [], repr(error), None
+    rows = [(path,) + row for row in node_rows(visitor.nodes)]
+    names = getattr(visitor, 'names', None)
+    if names is None:
+        # The budget was exceeded before the end of the tokenization.
+        # Degraded files have no names if the time limit is exceeded again
+        try:
+            names = extract_tokens(
+                visitor.code, lines=visitor.lcode, deadline=visitor.deadline
+            )[2]
+        except BudgetExceeded:
+            names = {}
+    names = [row[:1] + (path,) + row[1:] for row in name_rows(names)]
+    return (
+        path, mtime, size, digest, dump(visitor.tree), rows, names, None,
+        visitor.degraded
+    )
+
+
+def clone_result(result, item):
+    """Copy the result of annotate_file to a file with the same content
+
+    Arguments:
+    result -- annotate_file result
+    item -- (path, mtime, size, hash, code) of the other file
+    """
+    path, mtime, size = item[:3]
+    _, _, _, digest, positions, rows, names, error, degraded = result
+    rows = [(path,) + row[1:] for row in rows]
+    names = [row[:1] + (path,) + row[2:] for row in names]
+    return path, mtime, size, digest, positions, rows, names, error, degraded
+
+
+class Index(object):
+    """SQLite index of node positions and name occurrences"""
+
+    def __init__(self, database):
+        self.connection = sqlite3.connect(database)
+        has_names = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'names'"
+        ).fetchone()
+        self.connection.executescript(SCHEMA)
+        if not has_names:
+            # Files indexed before the names table are annotated again
+            self.connection.execute(
+                "UPDATE files SET mtime = NULL, hash = NULL")
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def changed(self, paths):
+        """Yield (path, mtime, size, hash, code) of files that changed
+        Files with a new mtime, but the same hash, are only touched
+        """
+        cursor = self.connection.cursor()
+        for path in paths:
+            stat = os.stat(path)
+            row = cursor.execute(
+                "SELECT mtime, size, hash FROM files WHERE path = ?", (path,)
+            ).fetchone()
+            if row and row[0] == stat.st_mtime and row[1] == stat.st_size:
+                continue
+            with open(path, 'rb') as source:
+                code = source.read()
+            digest = hashlib.sha1(code).hexdigest()
+            if row and row[2] == digest:
+                cursor.execute(
+                    "UPDATE files SET mtime = ?, size = ? WHERE path = ?",
+                    (stat.st_mtime, stat.st_size, path)
+                )
+                continue
+            yield path, stat.st_mtime, stat.st_size, digest, code
+
+    def store(self, result):
+        """Store the result of annotate_file"""
+        (path, mtime, size, digest, positions, rows, names, error,
+         degraded) = result
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM nodes WHERE path = ?", (path,))
+        cursor.execute("DELETE FROM names WHERE path = ?", (path,))
+        cursor.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, mtime, size, digest, positions, error, degraded)
+        )
+        cursor.executemany(
+            "INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        cursor.executemany(
+            "INSERT INTO names VALUES (?, ?, ?, ?, ?, ?)", names
+        )
+
+    def prune(self, roots, paths):
+        """Remove files inside roots that are not in paths"""
+        paths = set(paths)
+        roots = [os.path.abspath(root) for root in roots]
+        cursor = self.connection.cursor()
+        removed = [
+            path for (path,) in cursor.execute("SELECT path FROM files")
+            if path not in paths and any(
+                path == root or path.startswith(os.path.join(root, ''))
+                for root in roots
+            )
+        ]
+        for path in removed:
+            cursor.execute("DELETE FROM nodes WHERE path = ?", (path,))
+            cursor.execute("DELETE FROM names WHERE path = ?", (path,))
+            cursor.execute("DELETE FROM files WHERE path = ?", (path,))
+        return removed
+
+    def add(self, summary, result):
+        """Store the result of annotate_file and count it in summary"""
+        self.store(result)
+        summary['indexed'] += 1
+        summary['errors'] += result[-2] is not None
+        summary['degraded'] += result[-1] is not None
+
+    def degraded(self):
+        """Return (path, exceeded budget) of files with CPython positions"""
+        return self.connection.execute(
+            "SELECT path, degraded FROM files WHERE degraded IS NOT NULL "
+            "ORDER BY path"
+        ).fetchall()
+
+    def occurrences(self, name):
+        """Return (path, (first_line, first_col), (last_line, last_col)) of
+        the tokens of an identifier, sorted by path and position
+        """
+        return [
+            (path, (first_line, first_col), (last_line, last_col))
+            for path, first_line, first_col, last_line, last_col
+            in self.connection.execute(
+                "SELECT path, first_line, first_col, last_line, last_col "
+                "FROM names WHERE name = ? ORDER BY path, first_line, "
+                "first_col", (name,)
+            )
+        ]
+
+    def update(self, roots, jobs=None, chunksize=8, time_limit=None,
+               node_limit=None):
+        """Annotate the changed .py files of roots in parallel
+        Files with the same content are annotated once
+        Return a dict with the number of indexed, unchanged, removed,
+        failed and degraded files
+
+        Arguments:
+        roots -- directories or files
+
+        Keyword Arguments:
+        jobs -- number of worker processes. Use 1 to annotate in this process
+        chunksize -- number of files sent to a worker at once
+        time_limit -- seconds per file before falling back to CPython
+                      positions
+        node_limit -- number of nodes per file above which CPython positions
+                      are used
+        """
+        paths = find_files(roots)
+        changed = list(self.changed(paths))
+        summary = {
+            'indexed': 0, 'unchanged': len(paths) - len(changed),
+            'removed': len(self.prune(roots, paths)), 'errors': 0,
+            'degraded': 0,
+        }
+        annotate = functools.partial(
+            annotate_file, time_limit=time_limit, node_limit=node_limit
+        )
+        unique, duplicates = {}, []
+        for item in changed:
+            if item[3] in unique:
+                duplicates.append(item)
+            else:
+                unique[item[3]] = item
+        shared = {item[3] for item in duplicates}
+        if jobs == 1 or len(unique) <= 1:
+            results = map(annotate, unique.values())
+            executor = None
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(jobs)
+            results = executor.map(
+                annotate, unique.values(), chunksize=chunksize
+            )
+        annotated = {}
+        try:
+            for result in results:
+                if result[3] in shared:
+                    annotated[result[3]] = result
+                self.add(summary, result)
+            for item in duplicates:
+                result = annotated[item[3]]
+                if result[-2] is not None:
+                    # The error message refers to the path
+                    result = annotate(item)
+                self.add(summary, clone_result(result, item))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.connection.commit()
+        return summary
@@ -4,11 +4,7 @@
 
 from __future__ import (absolute_import, division, unicode_literals)
 
-from copy import copy
-
-from .constants import WHITESPACE
-from .utils import (inc_tuple, dec_tuple, LineCol, position_between,
-                    find_in_between)
+from .utils import LineCol, position_between
 
 
 class NodeWithPosition(object):
@@ -26,6 +22,55 @@ class NodeWithPosition(object):
             "{0.uid})"
         ).format(self)
 
+def shift_positions(nodes, dline, dcol):
+    """Move positions of code annotated from line 1, col 0 to start at line
+    1 + dline, col dcol. Columns only change on the first line
+    CPython positions (lineno, col_offset, ...) are moved as well
+
+    Arguments:
+    nodes -- annotated nodes (LineProvenanceVisitor.nodes)
+    dline -- lines to add
+    dcol -- columns to add on the first line
+    """
+    shifted = set()
+
+    def shift(item):
+        if item.first_line == 1:
+            item.first_col += dcol
+        if item.last_line == 1:
+            item.last_col += dcol
+        item.first_line += dline
+        item.last_line += dline
+        if 'uid' in item.__dict__:
+            line, col = item.uid
+            item.uid = (line + dline, col + dcol if line == 1 else col)
+
+    def shift_extra(value):
+        if isinstance(value, NodeWithPosition):
+            if id(value) not in shifted:
+                shifted.add(id(value))
+                shift(value)
+        elif isinstance(value, (list, tuple)):
+            for element in value:
+                shift_extra(element)
+
+    for node in nodes:
+        attributes = node.__dict__
+        if 'first_line' in attributes:
+            shift(node)
+        if attributes.get('lineno') is not None:
+            if node.lineno == 1:
+                node.col_offset += dcol
+            node.lineno += dline
+        if attributes.get('end_lineno') is not None:
+            if node.end_lineno == 1:
+                node.end_col_offset += dcol
+            node.end_lineno += dline
+        for name, value in attributes.items():
+            if name not in node._fields:
+                shift_extra(value)
+
+
 def nprint(node):
     d = dir(node)
     print('-----------')
@@ -101,14 +146,19 @@ def r_set_previous_element(node, previous, element_dict, inclusive=False):
     r_set_pos(node, *element_dict.find_previous(position, inclusive=inclusive))
 
 
-def keyword_followed_by_ids(node, keyword, names, ids, bytes_pos_to_utf8):
+def keyword_followed_by_ids(node, keyword, names, ids, bytes_pos_to_utf8,
+                            aux=True):
+    """Position a keyword followed by names (global, nonlocal)
+    Set node.ids_pos if aux"""
     node.uid, first = keyword.find_next(ast_pos(node, bytes_pos_to_utf8))
     node.first_line, node.first_col = first
     last = node.uid
-    node.ids_pos = []
+    ids_pos = []
     for name in ids:
         last, first = names[name].find_next(last)
-        node.ids_pos.append(NodeWithPosition(last, first, '<name>'))
+        ids_pos.append(NodeWithPosition(last, first, '<name>'))
+    if aux:
+        node.ids_pos = ids_pos
 
     node.last_line, node.last_col = last
 
@@ -116,63 +166,52 @@ def keyword_followed_by_ids(node, keyword, names, ids, bytes_pos_to_utf8):
 def start_by_keyword(node, keyword, bytes_pos_to_utf8, set_last=True, inclusive=False, delta=(0, 0)):
     position = ast_pos(node, bytes_pos_to_utf8)
     position = (position[0] + delta[0], position[1] + delta[1])
-    try:
-        node.uid, first = keyword.find_next(position, inclusive=inclusive)
-        if first != position:
-            raise IndexError
-    except IndexError:
+    node.uid, first = keyword.get_next(position, inclusive=inclusive)
+    if first != position:
         node.uid, first = keyword.find_previous(position, inclusive=inclusive)
     node.first_line, node.first_col = first
     if set_last:
         node.last_line, node.last_col = node.uid
 
 
-def update_expr_parenthesis(code, parenthesis, node):
-    """Find parenthesis before and after node"""
-    position = (node.first_line, node.first_col)
-    open_paren, close_paren = find_in_between(position, parenthesis)
-    if not open_paren:
-        # There is not opening parenthesis
+def update_expr_parenthesis(layers, node, aux=True):
+    """Find parenthesis before and after node
+    Set pos_before, pos_inner and pos_after if aux"""
+    first = (node.first_line, node.first_col)
+    last = (node.last_line, node.last_col)
+    open_paren, _ = layers.find_in_between(first)
+    if not open_paren or not layers.wraps(open_paren, first, last):
+        # There is not a parenthesis wrapping the node
         return
-    open_paren = LineCol(code, *open_paren)
-    close_paren = LineCol(code, *dec_tuple(close_paren))
-
-    start = LineCol(code, node.first_line, node.first_col)
-    end = LineCol(code, node.last_line, node.last_col)
-    original_start = copy(start)
-    original_end = copy(end)
-
-    start.dec()
-    while start > open_paren and not start.bof and start.char() in WHITESPACE:
-        start.dec()
 
-    while end < close_paren and not end.eof and end.char() in WHITESPACE:
-        end.inc()
-
-    if start == open_paren and end == close_paren:
-        end_tuple = inc_tuple(end.tuple())
-        node.first_line, node.first_col = start.tuple()
+    while open_paren:
+        end_tuple = layers.parenthesis[open_paren]
+        node.first_line, node.first_col = open_paren
         if node.uid == (node.last_line, node.last_col):
             node.uid = end_tuple
         node.last_line, node.last_col = end_tuple
+        open_paren = layers.wrapping(open_paren)
 
-        update_expr_parenthesis(code, parenthesis, node)
+    if not aux:
+        return
+    original_start = LineCol(layers.code, *first).tuple()
+    original_end = LineCol(layers.code, *last).tuple()
 
-        node.pos_before = NodeWithPosition(
-            original_start.tuple(),
-            (node.first_line, node.first_col),
-            '(',
-        )
-        node.pos_inner = NodeWithPosition(
-            original_end.tuple(),
-            original_start.tuple(),
-            '<inner>'
-        )
-        node.pos_after = NodeWithPosition(
-            (node.last_line, node.last_col),
-            original_end.tuple(),
-            ')',
-        )
+    node.pos_before = NodeWithPosition(
+        original_start,
+        (node.first_line, node.first_col),
+        '(',
+    )
+    node.pos_inner = NodeWithPosition(
+        original_end,
+        original_start,
+        '<inner>'
+    )
+    node.pos_after = NodeWithPosition(
+        (node.last_line, node.last_col),
+        original_end,
+        ')',
+    )
 
 
 def update_position_between_cursors(code, node, start, end):
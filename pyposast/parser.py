@@ -5,27 +5,41 @@
 from __future__ import (absolute_import, division)
 
 import bisect
+import functools
+import itertools
+import re
 import tokenize
 
 from collections import OrderedDict, defaultdict
+from timeit import default_timer
 
 from .cross_version import StringIO, ge_python312
+from .utils import BudgetExceeded
 from .constants import (KEYWORDS, COMBINED_KEYWORDS, SEMI_KEYWORDS,
-                        FUTURE_KEYWORDS, PAST_KEYWORKDS)
+                        FUTURE_KEYWORDS, PAST_KEYWORKDS, OPERATORS)
 
 
 class ElementDict(OrderedDict):
+    """Sorted dict of positions with bisect lookups
+    Keys are listed on creation, so that lookups never modify the dict and a
+    built ElementDict can be shared by threads. Call set_keys after changing
+    the dict
+    """
 
     def __init__(self, *args, **kwargs):
         super(ElementDict, self).__init__(*args, **kwargs)
-        self._bkeys = None
+        self._bkeys = list(self.keys())
 
     def set_keys(self):
-        if not self._bkeys:
-            self._bkeys = list(self.keys())
+        self._bkeys = list(self.keys())
+
+    def sorted_keys(self):
+        """Return the sorted list of keys used by the lookups
+        The list is shared. Do not modify it
+        """
+        return self._bkeys
 
     def find_next(self, position, inclusive=False):
-        self.set_keys()
         if inclusive:
             position = (position[0], position[1] + 1)
         index = bisect.bisect_left(self._bkeys, position)
@@ -34,7 +48,6 @@ class ElementDict(OrderedDict):
         return key, value
 
     def find_previous(self, position, inclusive=False):
-        self.set_keys()
         if inclusive:
             position = (position[0], position[1] + 1)
         index = bisect.bisect_left(self._bkeys, position)
@@ -42,6 +55,51 @@ class ElementDict(OrderedDict):
         value = self[key]
         return key, value
 
+    def get_next(self, position, inclusive=False):
+        """Return the first (key, value) with key >= position
+        Return (None, None) if there is no such element
+        """
+        if inclusive:
+            position = (position[0], position[1] + 1)
+        index = bisect.bisect_left(self._bkeys, position)
+        if index == len(self._bkeys):
+            return None, None
+        key = self._bkeys[index]
+        return key, self[key]
+
+    def get_previous(self, position, inclusive=False):
+        """Return the last (key, value) with key < position
+        Return (None, None) if there is no such element
+        Differently from find_previous, it does not wrap around
+        """
+        if inclusive:
+            position = (position[0], position[1] + 1)
+        index = bisect.bisect_left(self._bkeys, position)
+        if index == 0:
+            return None, None
+        key = self._bkeys[index - 1]
+        return key, self[key]
+
+    def first_between(self, start, end):
+        """Return the first (key, value) with start <= key < end
+        Return (None, None) if there is no such element
+        """
+        index = bisect.bisect_left(self._bkeys, start)
+        if index == len(self._bkeys) or not self._bkeys[index] < end:
+            return None, None
+        key = self._bkeys[index]
+        return key, self[key]
+
+    def last_between(self, start, end):
+        """Return the last (key, value) with start <= key < end
+        Return (None, None) if there is no such element
+        """
+        index = bisect.bisect_left(self._bkeys, end) - 1
+        if index < 0 or self._bkeys[index] < start:
+            return None, None
+        key = self._bkeys[index]
+        return key, self[key]
+
     def r_find_next(self, position):
         key, value = self.find_next(position)
         return value, key
@@ -51,6 +109,34 @@ class ElementDict(OrderedDict):
         return value, key
 
 
+class OperatorIndex(dict):
+    """Map AST operator classes to a single ElementDict that merges the
+    positions of all their spellings (e.g. '+' and '+=' for ast.Add)
+    Each value is a (first, spelling) pair, indexed by the last position
+    The merged ElementDict of a class is built on its first access, or by
+    build before sharing the index between threads
+    """
+
+    def __init__(self, operators):
+        super(OperatorIndex, self).__init__()
+        self.operators = operators
+
+    def build(self):
+        """Build the ElementDicts of all operator classes"""
+        for cls in OPERATORS:
+            self[cls]
+
+    def __missing__(self, cls):
+        items = []
+        for spelling in OPERATORS[cls]:
+            elements = self.operators.get(spelling, {})
+            items.extend(
+                (last, (first, spelling)) for last, first in elements.items()
+            )
+        result = self[cls] = ElementDict(sorted(items))
+        return result
+
+
 class StackElement(dict):
 
     def __init__(self, open_str, close_str):
@@ -70,26 +156,177 @@ def apply_delta(original, dline, doffset):
     return (original[0] + dline, original[1] + doffset)
 
 
+def fstring_fields(body):
+    """Find the replacement fields in the body of an f-string (Python < 3.12)
+    Return a list of (open, close, end) indexes, where open is the index of
+    '{', close is the index of '}', and end is the index where the
+    expression of the field ends (before conversions and format specs)
+    Fields of format specs are included. Escaped braces are not fields
+    """
+    fields = []
+    stack = []  # [open, end, depth] of the fields being scanned
+    index, size = 0, len(body)
+    while index < size:
+        char = body[index]
+        if stack and stack[-1][1] is None:
+            # Expression
+            entry = stack[-1]
+            if char in '\'"':
+                quote = char * 3 if body.startswith(char * 3, index) else char
+                close = body.find(quote, index + len(quote))
+                if close == -1:
+                    break
+                index = close + len(quote)
+                continue
+            if char in '([{':
+                entry[2] += 1
+            elif char in ')]':
+                entry[2] -= 1
+            elif char == '}' and entry[2]:
+                entry[2] -= 1
+            elif char == '}':
+                stack.pop()
+                fields.append((entry[0], index, index))
+            elif not entry[2] and (char == ':' or (
+                    char == '!' and not body.startswith('=', index + 1))):
+                entry[1] = index
+        elif char == '{':
+            if not stack and body.startswith('{', index + 1):
+                index += 1
+            else:
+                stack.append([index, None, 0])
+        elif char == '}':
+            if stack:
+                entry = stack.pop()
+                fields.append((entry[0], index, entry[1]))
+            elif body.startswith('}', index + 1):
+                index += 1
+        index += 1
+    fields.sort()
+    return fields
+
+
+def blank(text):
+    """Replace all characters, except line breaks, by spaces"""
+    return NOT_LINE_BREAK.sub(' ', text)
+
+
+NOT_LINE_BREAK = re.compile(r'[^\r\n]')
+LINE_BREAK = re.compile(r'\n')
+FSTRING_PREFIX = re.compile(r'[a-eg-zA-EG-Z]*[fF]')
+IGNORED_FSTRING_TOKENS = {
+    tokenize.NEWLINE, tokenize.NL, tokenize.INDENT, tokenize.DEDENT,
+    tokenize.ENDMARKER
+}
+
+
 class TokenCollector(object):
 
-    def __init__(self):
+    def __init__(self, deadline=None):
+        self.deadline = deadline
         self.stacks = self.parenthesis, self.sbrackets, self.brackets = [
             StackElement(*x) for x in (('(', ')'), ('[', ']'), ('{', '}'))
         ]
         self.strings, self.attributes, self.numbers = {}, {}, {}
         self.operators = defaultdict(dict)
         self.names = defaultdict(dict)
+        self.comments = {}
+        self.blank_lines = []
         self.tokens = []
 
-    def loop(self, code, dline=0, doffset=0):
+    def fstring_tokens(self, t_string, start):
+        """Tokenize the expressions of all fields of an f-string at once
+        (Python 3.6 <= x < 3.12)
+        Register the braces of each field and yield the tokens of the
+        expressions with absolute positions. Consecutive fields are
+        separated by NEWLINE tokens, as if they were tokenized separately
+
+        Arguments:
+        t_string -- f-string token
+        start -- absolute position of the token
+        """
+        quote_index = min(
+            index for index in (t_string.find('"'), t_string.find("'"))
+            if index >= 0
+        )
+        quote = t_string[quote_index] * (
+            3 if t_string.startswith(t_string[quote_index] * 3, quote_index)
+            else 1
+        )
+        body_start = quote_index + len(quote)
+        body = t_string[body_start:-len(quote)]
+        fields = fstring_fields(body)
+        if not fields:
+            return
+
+        line_starts = [0] + [match.end() for match in LINE_BREAK.finditer(body)]
+        srow, scol = start
+        first_col = scol + body_start
+
+        def position(index):
+            """Absolute position of body index"""
+            row = bisect.bisect_right(line_starts, index) - 1
+            if row == 0:
+                return (srow, first_col + index)
+            return (srow + row, index - line_starts[row])
+
+        pieces = ['(']
+        previous = 0
+        for fopen, fclose, fend in fields:
+            self.brackets.check('{', position(fopen), position(fopen + 1))
+            self.brackets.check('}', position(fclose), position(fclose + 1))
+            pieces.append(blank(body[previous:fopen + 1]))
+            pieces.append(body[fopen + 1:fend])
+            previous = fend
+        pieces.append(blank(body[previous:]))
+        pieces.append(')')
+
+        def absolute(synthetic):
+            """Absolute position of a position in the tokenized text"""
+            row, col = synthetic
+            if row == 1:
+                return (srow, first_col + col - 1)
+            return (srow + row - 1, col)
+
+        text = ''.join(pieces)
+        closing = (len(line_starts), len(text) - text.rfind('\n') - 2)
+        opens = [fopen for fopen, _, _ in fields]
+        field = None
+        end = start
+        f = StringIO(text)
+        for tok in tokenize.generate_tokens(f.readline):
+            t_type, t_string, t_srow_scol, t_erow_ecol, t_line = tok
+            if t_type in IGNORED_FSTRING_TOKENS or t_srow_scol in ((1, 0), closing):
+                continue
+            row, col = t_srow_scol
+            index = line_starts[row - 1] + (col - 1 if row == 1 else col)
+            current = bisect.bisect_right(opens, index)
+            if field is not None and current != field:
+                yield (tokenize.NEWLINE, '', end, end, t_line)
+            field = current
+            end = absolute(t_erow_ecol)
+            yield (t_type, t_string, absolute(t_srow_scol), end, t_line)
+        if field is not None:
+            yield (tokenize.NEWLINE, '', end, end, '')
+
+    def loop(self, code, dline=0, doffset=0, lines=None):
+        if lines is None:
+            readline = StringIO(code).readline
+        else:
+            readline = line_reader(lines)
+        self.collect(tokenize.generate_tokens(readline), dline, doffset)
+
+    def collect(self, tokens, dline=0, doffset=0):
         last = None
         dots = 0 # number of dots
         first_dot = None
 
         fstring_stack = [[None, []]]
 
-        f = StringIO(code)
-        for tok in tokenize.generate_tokens(f.readline):
+        deadline = self.deadline
+        for tok in tokens:
+            if deadline is not None and default_timer() > deadline:
+                raise BudgetExceeded('time limit')
             self.tokens.append(tok)
             t_type, t_string, t_srow_scol, t_erow_ecol, t_line = tok
             # ToDo: apply delta
@@ -111,27 +348,8 @@ class TokenCollector(object):
                         first_dot = None
                 self.operators[t_string][t_erow_ecol] = t_srow_scol
             elif t_type == tokenize.STRING:
-                if t_string.startswith('f'): # Python 3.6 <= x < 3.12
-                    inner = t_string[2:-1]
-                    stack = []
-                    for index, char in enumerate(inner):
-                        if char == "{":
-                            if not stack or stack[-1] != index - 1:
-                                stack.append(index)
-                        if char == "}" and stack:
-                            oindex = stack.pop()
-                            sub = inner[oindex + 1:index]
-                            self.brackets.check(
-                                "{",
-                                apply_delta(t_srow_scol, 0, oindex + 2),
-                                apply_delta(t_srow_scol, 0, oindex + 3),
-                            )
-                            self.brackets.check(
-                                "}",
-                                apply_delta(t_srow_scol, 0, index + 2),
-                                apply_delta(t_srow_scol, 0, index + 3),
-                            )
-                            self.loop(sub, t_srow_scol[0] - 1, t_srow_scol[1] + oindex + 3)
+                if FSTRING_PREFIX.match(t_string): # Python 3.6 <= x < 3.12
+                    self.collect(self.fstring_tokens(t_string, t_srow_scol))
 
                 start = t_srow_scol
                 if last and last[0] == tokenize.STRING:
@@ -147,6 +365,10 @@ class TokenCollector(object):
                 fstring_stack[-1][1].append(''.join(parts))
             elif t_type == tokenize.NUMBER:
                 self.numbers[t_erow_ecol] = t_srow_scol
+            elif t_type == tokenize.COMMENT:
+                self.comments[t_erow_ecol] = t_srow_scol
+            elif t_type == tokenize.NL and not t_line.strip():
+                self.blank_lines.append(t_srow_scol[0])
             elif t_type == tokenize.NAME and t_string == 'elif':
                 self.operators['if'][t_erow_ecol] = t_srow_scol
             elif t_type == tokenize.NAME and t_string in PAST_KEYWORKDS.keys():
@@ -178,10 +400,37 @@ class TokenCollector(object):
             if t_type != tokenize.NL:
                 last = tok
 
-def extract_tokens(code, return_tokens=False):
+def line_reader(lines):
+    """Return a readline function over lines split by '\\n'
+    It avoids tokenizing from a StringIO copy of the whole code
+    """
+    def read():
+        for line in itertools.islice(lines, len(lines) - 1):
+            yield line + '\n'
+        yield lines[-1]
+        while True:
+            yield ''
+    return functools.partial(next, read())
+
+
+def extract_tokens(code, return_tokens=False, lines=None, deadline=None,
+                   chunks=None):
+    """Collect tokens of code
+    Use lines (code.split('\\n')) as the source if they are available
+    Raise BudgetExceeded after the deadline (default_timer value)
+    Only tokenize the (first, last) line chunks if they are not None. Each
+    chunk must start at the beginning of a logical line
+    Return ([parenthesis, sbrackets, brackets, strings, attributes, numbers,
+    comments, blank lines], operators, names)
+    """
     # Should I implement a LL 1 parser?
-    toc = TokenCollector()
-    toc.loop(code)
+    toc = TokenCollector(deadline)
+    if chunks is None:
+        toc.loop(code, lines=lines)
+    else:
+        lines = lines if lines is not None else code.split('\n')
+        for first, last in chunks:
+            toc.loop(None, first - 1, lines=lines[first - 1:last] + [''])
 
     if return_tokens:
         return toc.tokens
@@ -193,6 +442,8 @@ def extract_tokens(code, return_tokens=False):
         ElementDict(sorted(toc.strings.items())),
         ElementDict(sorted(toc.attributes.items())),
         ElementDict(sorted(toc.numbers.items())),
+        ElementDict(sorted(toc.comments.items())),
+        sorted(toc.blank_lines),
     ]
     operators = {k: ElementDict(sorted(v.items()))
                  for k, v in toc.operators.items()}
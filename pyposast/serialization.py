@@ -0,0 +1,295 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Compact binary format for PyPosAST positions
+
+The format stores only what the visitor adds to the tree. Loading it
+reattaches positions to a freshly parsed tree of the same code
+
+Layout (little endian):
+header -- magic, version, number of strings, nodes and ints
+strings -- uint32 length of each string followed by the utf-8 data
+ints -- int32 array with a record per node in preorder, followed by the
+        number of extra attributes and the extra attribute records
+        (node index, name code, tagged value)
+
+A node record starts with (type code << 2 | flags). Nodes with
+HAS_POSITION have first line, first col, last line and last col. Nodes
+with HAS_UID also have uid line and uid col. Otherwise, uid is the last
+position. Nodes with only HAS_UID (detail='extents') have the four
+positions and no uid. NodeWithPosition values follow the same rule with
+NWP/NWP_UID
+"""
+from __future__ import (absolute_import, division)
+
+import ast
+import struct
+import sys
+
+try:
+    import copyreg
+except ImportError:  # Python 2
+    import copy_reg as copyreg
+
+try:
+    from sys import intern
+except ImportError:  # Python 2 has the builtin intern
+    pass
+
+from array import array
+
+from .cross_version import iternext
+from .node_helpers import NodeWithPosition
+from .utils import preorder, number_nodes
+
+
+MAGIC = b'PPAS'
+VERSION = 1
+HEADER = struct.Struct('<4sHIII')
+POSITION = ('first_line', 'first_col', 'last_line', 'last_col', 'uid')
+# Attributes recomputed by load
+RECOMPUTED = ('node_id',)
+# Attributes that are not dumped
+TRANSIENT = ('node_index',)
+
+# Node flags
+HAS_POSITION, HAS_UID = 1, 2
+# Flags of nodes with an extent and no uid
+NO_UID = HAS_UID
+
+# Value tags
+NONE, INT, STR, TUPLE, LIST, NODE, NWP, NWP_UID, NWP_REF = range(9)
+
+
+def _to_bytes(ints):
+    try:
+        return ints.tobytes()
+    except AttributeError:  # Python 2
+        return ints.tostring()
+
+
+def _from_bytes(ints, data):
+    try:
+        ints.frombytes(data)
+    except AttributeError:  # Python 2
+        ints.fromstring(data)
+
+
+def _to_little_endian(ints):
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return ints
+
+
+class _Encoder(object):
+    """Encode nodes and extra attributes into ints"""
+
+    def __init__(self, nodes):
+        self.ints = []
+        self.strings = {}
+        self.node_ids = {id(node): index for index, node in enumerate(nodes)}
+        self.nwp_ids = {}
+
+    def string(self, value):
+        """Return the code of an interned string"""
+        try:
+            return self.strings[value]
+        except KeyError:
+            code = self.strings[value] = len(self.strings)
+            return code
+
+    def position(self, code, uid_code, node):
+        """Encode the position of a node or NodeWithPosition"""
+        last = (node.last_line, node.last_col)
+        same_uid = node.uid == last
+        self.ints.append(code if same_uid else uid_code)
+        self.ints.extend((node.first_line, node.first_col) + last)
+        if not same_uid:
+            self.ints.extend(node.uid)
+
+    def node(self, node):
+        code = self.string(type(node).__name__) << 2
+        attributes = node.__dict__
+        if 'uid' in attributes:
+            code |= HAS_POSITION
+            self.position(code, code | HAS_UID, node)
+        elif 'first_line' in attributes:
+            self.ints.extend((
+                code | NO_UID, node.first_line, node.first_col,
+                node.last_line, node.last_col
+            ))
+        else:
+            self.ints.append(code)
+
+    def value(self, value):
+        ints = self.ints
+        if value is None:
+            ints.append(NONE)
+        elif isinstance(value, int):
+            ints.extend((INT, value))
+        elif isinstance(value, str):
+            ints.extend((STR, self.string(value)))
+        elif isinstance(value, (tuple, list)):
+            ints.extend((TUPLE if isinstance(value, tuple) else LIST, len(value)))
+            for element in value:
+                self.value(element)
+        elif isinstance(value, NodeWithPosition):
+            if id(value) in self.nwp_ids:
+                ints.extend((NWP_REF, self.nwp_ids[id(value)]))
+                return
+            self.nwp_ids[id(value)] = len(self.nwp_ids)
+            self.position(NWP, NWP_UID, value)
+            ints.append(self.string(value.kind))
+        elif id(value) in self.node_ids:
+            ints.extend((NODE, self.node_ids[id(value)]))
+        else:
+            raise TypeError("Cannot dump {!r}".format(value))
+
+
+def dump(tree):
+    """Dump the positions of a tree parsed by PyPosAST to bytes"""
+    nodes = preorder(tree)
+    encoder = _Encoder(nodes)
+    extras = []
+    for index, node in enumerate(nodes):
+        encoder.node(node)
+        skip = set(node._fields)
+        skip.update(node._attributes)
+        skip.update(POSITION)
+        skip.update(RECOMPUTED)
+        skip.update(TRANSIENT)
+        extras.extend(
+            (index, name) for name in node.__dict__ if name not in skip
+        )
+    encoder.ints.append(len(extras))
+    for index, name in extras:
+        encoder.ints.extend((index, encoder.string(name)))
+        encoder.value(getattr(nodes[index], name))
+
+    strings = sorted(encoder.strings, key=encoder.strings.get)
+    encoded = [text.encode('utf-8') for text in strings]
+    ints = _to_little_endian(array('i', encoder.ints))
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, len(encoded), len(nodes), len(ints)),
+        struct.pack('<{}I'.format(len(encoded)), *map(len, encoded)),
+        b''.join(encoded),
+        _to_bytes(ints),
+    ])
+
+
+def load(data, code=None, tree=None, filename='<unknown>', mode='exec',
+         **parse_args):
+    """Load positions dumped by dump into a tree. Return the tree
+
+    Arguments:
+    data -- bytes produced by dump
+
+    Keyword Arguments:
+    code -- code text. Used to parse a new tree if tree is None
+    tree -- freshly parsed tree of the same code
+    filename -- code path
+    mode -- execution mode (exec, eval, single)
+    """
+    if tree is None:
+        tree = ast.parse(code, filename, mode=mode, **parse_args)
+    magic, version, nstrings, nnodes, nints = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Invalid PyPosAST dump")
+    if version != VERSION:
+        raise ValueError("Unsupported PyPosAST dump version: {}".format(version))
+    offset = HEADER.size
+    lengths = struct.unpack_from('<{}I'.format(nstrings), data, offset)
+    offset += 4 * nstrings
+    strings = []
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    ints = array('i')
+    _from_bytes(ints, data[offset:offset + 4 * nints])
+    next_int = iternext(_to_little_endian(ints).tolist())
+
+    nodes = preorder(tree)
+    if len(nodes) != nnodes:
+        raise ValueError("The dump does not match the tree")
+    for node in nodes:
+        word = next_int()
+        if strings[word >> 2] != type(node).__name__:
+            raise ValueError("The dump does not match the tree")
+        if word & HAS_POSITION:
+            node.first_line = next_int()
+            node.first_col = next_int()
+            last = node.last_line, node.last_col = next_int(), next_int()
+            node.uid = (next_int(), next_int()) if word & HAS_UID else last
+        elif word & NO_UID:
+            node.first_line = next_int()
+            node.first_col = next_int()
+            node.last_line, node.last_col = next_int(), next_int()
+
+    positions = []
+
+    def value():
+        tag = next_int()
+        if tag == NONE:
+            return None
+        if tag == INT:
+            return next_int()
+        if tag == STR:
+            return strings[next_int()]
+        if tag == NWP_REF:
+            return positions[next_int()]
+        if tag == NODE:
+            return nodes[next_int()]
+        if tag == NWP or tag == NWP_UID:
+            first = next_int(), next_int()
+            last = next_int(), next_int()
+            result = NodeWithPosition(last, first, None)
+            if tag == NWP_UID:
+                result.uid = next_int(), next_int()
+            result.kind = strings[next_int()]
+            positions.append(result)
+            return result
+        values = [value() for _ in range(next_int())]
+        return tuple(values) if tag == TUPLE else values
+
+    for _ in range(next_int()):
+        node = nodes[next_int()]
+        setattr(node, strings[next_int()], value())
+    number_nodes(tree)
+    return tree
+
+
+def _load_position(first_line, first_col, last_line, last_col, kind,
+                   uid=None):
+    """Rebuild a NodeWithPosition reduced by _reduce_position"""
+    position = object.__new__(NodeWithPosition)
+    position.first_line = first_line
+    position.first_col = first_col
+    position.uid = uid or (last_line, last_col)
+    position.last_line = last_line
+    position.last_col = last_col
+    position.kind = kind
+    return position
+
+
+def _reduce_position(position):
+    """Reduce NodeWithPosition to a tuple of ints and an interned kind"""
+    attributes = position.__dict__
+    if len(attributes) != 6:
+        return position.__reduce_ex__(2)
+    kind = position.kind
+    args = (
+        position.first_line, position.first_col,
+        position.last_line, position.last_col,
+        intern(kind) if type(kind) is str else kind,
+    )
+    if position.uid != args[2:4]:
+        args += (position.uid,)
+    return _load_position, args
+
+
+def register_reducers():
+    """Register a copyreg reducer for NodeWithPosition
+    Pickling a tree parsed by PyPosAST stores each operator position as a
+    tuple of ints with an interned kind, instead of a dict
+    """
+    copyreg.pickle(NodeWithPosition, _reduce_position)
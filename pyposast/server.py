@@ -0,0 +1,168 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+"""Long-lived annotation server over a Unix-domain socket
+
+The server keeps a pool of worker processes and a LRU cache of annotated
+files. Cached files are annotated again when their mtime or size change.
+See pyposast.client for the protocol and the client
+
+Requests:
+{"command": "nodes", "path": path, "type": type or null}
+{"command": "node_at", "path": path, "line": line, "col": col}
+{"command": "stats"}
+{"command": "shutdown"}
+
+Responses: {"result": result} or {"error": message}
+"""
+from __future__ import (absolute_import, division)
+
+import os
+import socketserver
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .client import send_message, receive_message
+from .index import node_rows
+from .visitor import LineProvenanceVisitor
+
+
+def annotate_path(path):
+    """Annotate a file. Used by worker processes
+    Return (mtime, size, node rows, error)
+    """
+    stat = os.stat(path)
+    try:
+        with open(path, 'rb') as source:
+            code = source.read()
+        rows = node_rows(LineProvenanceVisitor(code, path).nodes)
+    except Exception as error:  # pylint: disable=broad-except
+        # Errors are cached like results, until the file changes
+        return stat.st_mtime, stat.st_size, None, repr(error)
+    return stat.st_mtime, stat.st_size, rows, None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            request = receive_message(self.request)
+            if request is None:
+                return
+            try:
+                response = {'result': self.server.answer(request)}
+            except Exception as error:  # pylint: disable=broad-except
+                # Malformed requests get a reply and keep the connection
+                response = {'error': str(error)}
+            send_message(self.request, response)
+
+
+class AnnotationServer(socketserver.ThreadingMixIn,
+                       socketserver.UnixStreamServer):
+    """Annotation server. Each connection is handled by a thread"""
+    daemon_threads = True
+
+    def __init__(self, address, jobs=None, cache_size=256):
+        """
+        Arguments:
+        address -- path of the Unix-domain socket
+
+        Keyword Arguments:
+        jobs -- number of worker processes. Use 1 to annotate in the server
+        cache_size -- maximum number of annotated files in memory
+        """
+        socketserver.UnixStreamServer.__init__(self, address, _Handler)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.executor = None
+        if jobs != 1:
+            jobs = jobs or os.cpu_count() or 1
+            self.executor = ProcessPoolExecutor(jobs)
+            # Start the workers before the first request
+            for _ in range(jobs):
+                self.executor.submit(int)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if self.executor is not None:
+            self.executor.shutdown()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+    def annotated(self, path):
+        """Return (node rows, error) of a file. Use the cache if it is valid
+        Concurrent requests of the same file wait for a single annotation
+        """
+        stat = os.stat(path)
+        key = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            entry = self.cache.get(path)
+            if entry is not None and entry[0] == key:
+                self.cache.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            future = self.pending.get(path)
+            owner = future is None
+            if owner:
+                future = self.pending[path] = Future()
+        if owner:
+            try:
+                if self.executor is None:
+                    result = annotate_path(path)
+                else:
+                    result = self.executor.submit(annotate_path, path).result()
+            except BaseException as error:
+                future.set_exception(error)
+                result = None
+            else:
+                future.set_result(result)
+            with self.lock:
+                del self.pending[path]
+                if result is not None:
+                    mtime, size, rows, error = result
+                    self.cache[path] = ((mtime, size), (rows, error))
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+        mtime, size, rows, error = future.result()
+        return rows, error
+
+    def answer(self, request):
+        """Return the result of a request"""
+        command = request['command']
+        if command == 'stats':
+            return {
+                'files': len(self.cache), 'hits': self.hits,
+                'misses': self.misses,
+            }
+        if command == 'shutdown':
+            threading.Thread(target=self.shutdown).start()
+            return True
+        rows, error = self.annotated(request['path'])
+        if error is not None:
+            raise ValueError(error)
+        if command == 'nodes':
+            node_type = request.get('type')
+            return [row for row in rows if not node_type or row[1] == node_type]
+        if command == 'node_at':
+            position = (request['line'], request['col'])
+            result = None
+            for row in rows:
+                if row[2] is not None and row[2:4] <= position < row[4:6]:
+                    result = row
+            return result
+        raise ValueError("Unknown command: {}".format(command))
+
+
+def serve(address, jobs=None, cache_size=256):
+    """Run an annotation server until it receives a shutdown request"""
+    server = AnnotationServer(address, jobs=jobs, cache_size=cache_size)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
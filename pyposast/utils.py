@@ -4,9 +4,17 @@
 
 from __future__ import (absolute_import, division)
 
+import ast
+
+from copy import copy
+
 from .constants import WHITESPACE
 
 
+class BudgetExceeded(Exception):
+    """Annotation exceeded its time or node limit"""
+
+
 def pairwise(iterable):
     it = iter(iterable)
     a = next(it)
@@ -83,15 +91,77 @@ class LineCol(object):
 
 
 def find_in_between(position, elements):
-    try:
-        p1, p2 = elements.find_previous(position)
-    except IndexError:
-        return None, None
-    if not p1 < position < p2:
+    p1, p2 = elements.get_previous(position)
+    if p1 is None or not position < p2:
         return None, None
     return p1, p2
 
 
+class ParenthesisLayers(object):
+    """Nesting table of parenthesis pairs
+
+    Each pair is identified by its opening position and maps to its
+    whitespace-trimmed inner extent. Extents are computed on the first lookup
+    of a pair and reused afterwards. The pair that may directly enclose
+    another one is the previous key of the (sorted) parenthesis dict
+    """
+
+    def __init__(self, code, parenthesis):
+        self.code = code
+        self.parenthesis = parenthesis
+        self.keys = parenthesis.sorted_keys()
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.extents = {}
+
+    def inner(self, open_paren):
+        """Return first non-whitespace position after the opening parenthesis
+        and the position after the last non-whitespace before the closing one
+        """
+        result = self.extents.get(open_paren)
+        if result is not None:
+            return result
+        open_col = LineCol(self.code, *open_paren)
+        close_col = LineCol(self.code, *dec_tuple(self.parenthesis[open_paren]))
+
+        start = copy(open_col)
+        start.inc()
+        while start < close_col and not start.eof and start.char() in WHITESPACE:
+            start.inc()
+
+        end = copy(close_col)
+        end.dec()
+        while end > open_col and not end.bof and end.char() in WHITESPACE:
+            end.dec()
+
+        result = self.extents[open_paren] = (start.tuple(), inc_tuple(end.tuple()))
+        return result
+
+    def find_in_between(self, position):
+        """Return the pair that starts right before position and contains it"""
+        return find_in_between(position, self.parenthesis)
+
+    def wraps(self, open_paren, first, last):
+        """Check if the pair contains only whitespaces around (first, last)"""
+        close_paren = self.parenthesis[open_paren]
+        inner_first, inner_last = self.inner(open_paren)
+        return (
+            open_paren < first <= inner_first and
+            inner_last <= last < close_paren
+        )
+
+    def wrapping(self, open_paren):
+        """Return the pair that directly wraps the pair of open_paren"""
+        index = self.index[open_paren] - 1
+        if index < 0:
+            return None
+        previous = self.keys[index]
+        close_paren = self.parenthesis[open_paren]
+        if close_paren < self.parenthesis[previous] and self.wraps(
+                previous, open_paren, close_paren):
+            return previous
+        return None
+
+
 def position_between(code, position1, position2):
     if position1 > position2:
         position1, position2 = position2, position1
@@ -165,3 +235,193 @@ def extract_positions(utf8):
         bytes_pos_to_utf8[j] = i
         j += len(c.encode("utf-8"))
     return utf8_pos_to_bytes, bytes_pos_to_utf8
+
+
+def preorder(tree):
+    """Return the list of nodes of a tree in preorder"""
+    result = []
+    append = result.append
+    stack = [tree]
+    pop = stack.pop
+    AST = ast.AST
+    while stack:
+        node = pop()
+        append(node)
+        children = []
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, AST):
+                children.append(value)
+            elif isinstance(value, list):
+                children.extend(x for x in value if isinstance(x, AST))
+        children.reverse()
+        stack.extend(children)
+    return result
+
+
+def number_nodes(tree):
+    """Assign dense ids in preorder to the nodes of a tree (node.node_id)
+    Nodes without fields and attributes (contexts and operators) are
+    skipped, since ast shares them. Return the list that maps ids to nodes
+    """
+    nodes = [
+        node for node in preorder(tree) if node._fields or node._attributes
+    ]
+    for index, node in enumerate(nodes):
+        node.node_id = index
+    return nodes
+
+
+def copy_tree(tree):
+    """Copy the nodes of a tree, except shared contexts and operators
+    Field lists are copied. Other values are shared with the original tree
+    Return the copy and a dict that maps id(copy node) to original nodes
+    """
+    originals = {}
+    AST = ast.AST
+
+    def copy_node(node):
+        # ast may share nodes without fields (contexts and operators)
+        if not (node._fields or node._attributes):
+            return node
+        new = node.__class__.__new__(node.__class__)
+        new.__dict__.update(node.__dict__)
+        originals[id(new)] = node
+        stack.append(new)
+        return new
+
+    stack = []
+    root = copy_node(tree)
+    while stack:
+        attributes = stack.pop().__dict__
+        for name in attributes:
+            value = attributes[name]
+            if isinstance(value, AST):
+                attributes[name] = copy_node(value)
+            elif isinstance(value, list):
+                attributes[name] = [
+                    copy_node(element) if isinstance(element, AST)
+                    else element for element in value
+                ]
+    return root, originals
+
+
+class PositionTable(object):
+    """Positions of the nodes of a tree in a side table keyed by node id
+    Nodes are numbered as in number_nodes. The tree is not modified
+    """
+
+    def __init__(self, tree, nodes, positions):
+        self.tree = tree
+        self.nodes = nodes
+        self.positions = positions
+        self.ids = {id(node): index for index, node in enumerate(nodes)}
+        # Budget that was exceeded, if CPython positions were used
+        self.degraded = None
+        # NodeIndex, if it was requested
+        self.node_index = None
+
+    @classmethod
+    def from_copy(cls, tree, annotated, originals):
+        """Move the attributes that PyPosAST added to the annotated copy of
+        tree into a table. References to copied nodes point to tree nodes
+
+        Arguments:
+        tree -- original tree
+        annotated -- list of nodes of the annotated copy (number_nodes)
+        originals -- dict that maps id(copy node) to original nodes
+        """
+        containers = (list, tuple, ast.AST)
+
+        def original(value):
+            if isinstance(value, ast.AST):
+                return originals.get(id(value), value)
+            return type(value)(
+                original(element) if isinstance(element, containers)
+                else element for element in value
+            )
+
+        positions = []
+        skips = {}
+        for new in annotated:
+            skip = skips.get(new.__class__)
+            if skip is None:
+                skip = skips[new.__class__] = frozenset(
+                    new._fields + new._attributes + ('node_id',)
+                )
+            positions.append({
+                name: original(value) if isinstance(value, containers)
+                else value
+                for name, value in new.__dict__.items() if name not in skip
+            })
+        nodes = [originals[id(new)] for new in annotated]
+        return cls(tree, nodes, positions)
+
+    def node_id(self, node):
+        """Return the id of a node"""
+        return self.ids[id(node)]
+
+    def __getitem__(self, key):
+        """Return the positions of a node or node id"""
+        if isinstance(key, ast.AST):
+            key = self.ids[id(key)]
+        return self.positions[key]
+
+    def __len__(self):
+        return len(self.positions)
+
+
+class NodeIndex(object):
+    """Reverse index of the positions of a tree
+    uids maps uid -> list of nodes in preorder (nodes may share a uid)
+    extents maps ((first_line, first_col), (last_line, last_col)) -> node.
+    Nodes with the same extent (e.g., Expr and its value) map to the
+    outermost one
+    """
+
+    def __init__(self):
+        self.uids = {}
+        self.extents = {}
+
+    @classmethod
+    def from_nodes(cls, nodes, positions=None):
+        """Index nodes that have positions
+
+        Arguments:
+        nodes -- nodes in preorder
+
+
+        Keyword Arguments:
+        positions -- list of position dicts of a PositionTable. Default: the
+                     __dict__ of each node
+        """
+        index = cls()
+        uids, extents = index.uids, index.extents
+        for number, node in enumerate(nodes):
+            attributes = (
+                node.__dict__ if positions is None else positions[number]
+            )
+            if 'first_line' not in attributes:
+                continue
+            uid = attributes.get('uid')
+            if uid is not None:
+                same = uids.get(uid)
+                if same is None:
+                    uids[uid] = [node]
+                else:
+                    same.append(node)
+            extent = (
+                (attributes['first_line'], attributes['first_col']),
+                (attributes['last_line'], attributes['last_col'])
+            )
+            if extent not in extents:
+                extents[extent] = node
+        return index
+
+    def nodes_at(self, uid):
+        """Return the nodes with a uid"""
+        return self.uids.get(tuple(uid), [])
+
+    def node_at(self, first, last):
+        """Return the outermost node from first to last, or None"""
+        return self.extents.get((tuple(first), tuple(last)))
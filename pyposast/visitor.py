@@ -8,24 +8,32 @@ from __future__ import (absolute_import, division)
 import ast
 
 from copy import copy
-from operator import sub
 from functools import wraps
+from timeit import default_timer
 
 from .cross_version import only_python2, only_python3, native_decode_source
 from .cross_version import ge_python36, ge_python37, ge_python38, lt_python39
 from .cross_version import ge_python39, ge_python312, ge_python313
-from .constants import OPERATORS
-from .parser import extract_tokens
+from .constants import OPERATORS, WHITESPACE
+from .parser import extract_tokens, OperatorIndex
 from .utils import (pairwise, inc_tuple, dec_tuple, position_between,
                     find_next_parenthesis, find_next_comma, extract_positions,
-                    find_next_colon, find_next_equal, find_next_pipe)
+                    find_next_colon, find_next_equal, find_next_pipe,
+                    find_next_character,
+                    ParenthesisLayers, number_nodes, copy_tree,
+                    PositionTable, NodeIndex, BudgetExceeded)
 from .node_helpers import (NodeWithPosition, nprint, copy_info, ast_pos,
                            copy_from_lineno_col_offset, set_pos,
                            r_set_pos, min_first_max_last, set_max_position,
                            set_max_position, set_previous_element,
                            r_set_previous_element, update_expr_parenthesis,
                            increment_node_position, keyword_followed_by_ids,
-                           start_by_keyword)
+                           start_by_keyword, shift_positions)
+from .serialization import register_reducers
+
+
+# Pickle NodeWithPosition objects as compact tuples
+register_reducers()
 
 
 def extract_code(lines, node, lstrip="", ljoin="\n", strip=""):
@@ -73,11 +81,22 @@ def visit_expr(fn):
     def decorator(self, node, *args, **kwargs):
         result = self.generic_visit(node)
         fn(self, node, *args, **kwargs)
-        update_expr_parenthesis(self.lcode, self.parenthesis, node)
+        update_expr_parenthesis(self.parenthesis_layers, node, self.aux)
         return result
     return decorator
 
 
+def visit_collection(fn):
+    """visit_expr for collections. fn receives the separator after each
+    element, found by visit_elements, or None"""
+    @wraps(fn)
+    def decorator(self, node, *args, **kwargs):
+        separators = self.visit_elements(node)
+        fn(self, node, separators, *args, **kwargs)
+        update_expr_parenthesis(self.parenthesis_layers, node, self.aux)
+    return decorator
+
+
 def visit_all_if_condition_else_expr(condition):
     if condition:
         return visit_all
@@ -87,44 +106,309 @@ def visit_all_if_condition_else_expr(condition):
 visit_stmt = visit_all
 visit_mod = visit_all
 
+# Detail levels, from the lightest
+DETAIL_LEVELS = ('extents', 'uid', 'full')
+# Characters allowed around separators of collections. Lines are joined
+GAP_WHITESPACE = ''.join(WHITESPACE) + '\n'
+
 
 class LineProvenanceVisitor(ast.NodeVisitor):
     # pylint: disable=invalid-name, missing-docstring
     # pylint: disable=too-many-instance-attributes, too-many-public-methods
     # pylint: disable=no-self-use
 
-    def __init__(self, code, path, mode='exec', tree=None, **parse_args):
+    def __init__(self, code, path, mode='exec', tree=None, side_table=False,
+                 time_limit=None, node_limit=None, line_ranges=None,
+                 start=None, threads=None, detail='full', node_index=False,
+                 comments=False, **parse_args):
+        started = default_timer()
+        if detail not in DETAIL_LEVELS:
+            raise ValueError("Unknown detail level: {}".format(detail))
+        # op_pos, name_node and other auxiliary positions
+        self.aux = detail == 'full'
+        # uids that need a search besides the extent
+        self.uids = detail != 'extents'
         code = native_decode_source(code)
         self.tree = tree or ast.parse(code, path, mode=mode, **parse_args)
+        original = self.tree
+        if side_table:
+            self.tree, originals = copy_tree(original)
         self.code = code
         self.lcode = code.split('\n')
+        roots, chunks = [self.tree], None
+        if line_ranges is not None:
+            roots, chunks = self.select_statements(line_ranges)
+        lines = self.lcode
+        if chunks is not None:
+            # Lines of other statements are converted by native_col
+            lines = [''] * len(self.lcode)
+            for first, last in chunks:
+                lines[first - 1:last] = self.lcode[first - 1:last]
         self.utf8_pos_to_bytes = []
         self.bytes_pos_to_utf8 = []
         if ((only_python2 and isinstance(code, str)) or
                 (only_python3 and isinstance(code, bytes))):
-            for line in self.lcode:
+            for line in lines:
                 same = {j: j for j, c in enumerate(line)}
                 self.utf8_pos_to_bytes.append(same)
                 self.bytes_pos_to_utf8.append(same)
         else:
-            for line in self.lcode:
+            for line in lines:
                 utf8, byte = extract_positions(line)
                 self.utf8_pos_to_bytes.append(utf8)
                 self.bytes_pos_to_utf8.append(byte)
 
-        tokens, self.operators, self.names = extract_tokens(code)
-        self.parenthesis = tokens[0]
-        self.sbrackets = tokens[1]
-        self.brackets = tokens[2]
-        self.strings = tokens[3]
-        self.attributes = tokens[4]
-        self.numbers = tokens[5]
-        self.dline = 0
-        self.dcol = 0
-        self.visit(self.tree)
+        self.degraded = None
+        self.interrupted = []
+        self.deadline = None if time_limit is None else started + time_limit
+        try:
+            if node_limit is not None and node_limit < sum(
+                    1 for root in roots for _ in ast.walk(root)):
+                raise BudgetExceeded('node limit')
+            tokens, self.operators, self.names = extract_tokens(
+                code, lines=self.lcode, deadline=self.deadline, chunks=chunks
+            )
+            self.operators_by_class = OperatorIndex(self.operators)
+            self.parenthesis = tokens[0]
+            self.sbrackets = tokens[1]
+            self.brackets = tokens[2]
+            self.strings = tokens[3]
+            self.attributes = tokens[4]
+            self.numbers = tokens[5]
+            self.comments = tokens[6]
+            self.blank_lines = tokens[7]
+            self.parenthesis_layers = ParenthesisLayers(self.lcode, self.parenthesis)
+            self.dline = 0
+            self.dcol = 0
+            self.check_deadline()
+            if threads and threads > 1:
+                self.visit_parallel(roots, threads)
+            else:
+                for root in roots:
+                    self.visit(root)
+        except BudgetExceeded as exceeded:
+            self.degraded = str(exceeded)
+        self.nodes = number_nodes(self.tree)
+        if self.degraded or chunks is not None:
+            self.native_positions(self.nodes)
+        if not self.uids:
+            # uid was only the last position, to keep the visit uniform
+            for node in self.nodes:
+                node.__dict__.pop('uid', None)
+        if comments and not self.degraded:
+            self.attach_comments(self.nodes)
+        if start is not None and tuple(start) != (1, 0):
+            shift_positions(self.nodes, start[0] - 1, start[1])
+        self.table = None
+        if side_table:
+            self.table = PositionTable.from_copy(
+                original, self.nodes, originals
+            )
+            self.tree, self.nodes = original, self.table.nodes
+            self.table.degraded = self.degraded
+        elif self.degraded:
+            self.tree.degraded = self.degraded
+        self.node_index = None
+        if node_index:
+            positions = self.table.positions if side_table else None
+            self.node_index = NodeIndex.from_nodes(self.nodes, positions)
+            if side_table:
+                self.table.node_index = self.node_index
+            else:
+                self.tree.node_index = self.node_index
+
+    def visit_parallel(self, roots, threads):
+        """Visit top-level statements with a pool of threads
+        The token indexes are built before and only read by the visit, so
+        they are shared. It is only faster on free-threaded builds
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        self.operators_by_class.build()
+        module = None
+        if len(roots) == 1 and type(roots[0]) is ast.Module:
+            module = roots[0]
+            roots = module.body
+
+        def visit_statements(statements):
+            for statement in statements:
+                self.visit(statement)
+
+        size = threads * 4
+        with ThreadPoolExecutor(threads) as executor:
+            for _ in executor.map(
+                    visit_statements,
+                    [roots[index::size] for index in range(size)]):
+                pass
+        if module is not None:
+            # Other fields (e.g., type_ignores) are visited as in generic_visit
+            for field, value in ast.iter_fields(module):
+                if field == 'body':
+                    continue
+                for child in value if isinstance(value, list) else [value]:
+                    if isinstance(child, ast.AST):
+                        self.visit(child)
+            # Module positions only depend on its statements
+            LineProvenanceVisitor.visit_Module.__wrapped__(self, module)
+
+    def check_deadline(self):
+        if self.deadline is not None and default_timer() > self.deadline:
+            raise BudgetExceeded('time limit')
+
+    def native_col(self, line, col):
+        """Convert a CPython byte offset to a column"""
+        result = self.bytes_pos_to_utf8[line - 1].get(col)
+        if result is None:
+            encoded = self.lcode[line - 1].encode('utf-8')
+            result = len(encoded[:col].decode('utf-8', 'ignore'))
+        return result
+
+    def select_statements(self, line_ranges):
+        """Return the top-level statements that overlap line_ranges and the
+        (first, last) lines of their chunks. Statements that share lines
+        belong to the same chunk, since they cannot be tokenized apart
+        Return ([tree], None) if the tree has no statement list
+        Before Python 3.8, statements end where the next one starts
+        """
+        body = getattr(self.tree, 'body', None)
+        if not isinstance(body, list):
+            return [self.tree], None
+        firsts = [
+            min([stmt.lineno] + [
+                decorator.lineno
+                for decorator in getattr(stmt, 'decorator_list', ())
+            ])
+            for stmt in body
+        ]
+        lasts = [getattr(stmt, 'end_lineno', None) for stmt in body]
+        if None in lasts:
+            lasts = self.statement_last_lines(body, firsts)
+        groups = []
+        for stmt, first, last in zip(body, firsts, lasts):
+            if groups and first <= groups[-1][1]:
+                groups[-1][1] = max(groups[-1][1], last)
+                groups[-1][2].append(stmt)
+            else:
+                groups.append([first, last, [stmt]])
+        roots, chunks = [], []
+        for first, last, stmts in groups:
+            if any(first <= end and start <= last
+                   for start, end in line_ranges):
+                roots.extend(stmts)
+                chunks.append((first, last))
+        return roots, chunks
+
+    def statement_last_lines(self, body, firsts):
+        """Approximate the last lines of top-level statements without
+        end_lineno (Python < 3.8). A statement ends on the line before the
+        next one, or on the line of the next one if they are separated by ;
+        The last statement ends on the last line of code
+        """
+        lasts = []
+        for index, first in enumerate(firsts[1:]):
+            following = body[index + 1]
+            line = self.lcode[first - 1]
+            indent = len(line) - len(line.lstrip())
+            if first == following.lineno and following.col_offset > indent:
+                lasts.append(first)
+            else:
+                lasts.append(max(firsts[index], first - 1))
+        lasts.append(len(self.lcode))
+        return lasts
+
+    def native_positions(self, nodes):
+        """Use CPython positions for nodes that were not annotated
+        Nodes without CPython positions span their children. Nodes without
+        end_lineno (Python < 3.8) end where they start
+
+        Arguments:
+        nodes -- nodes in preorder
+        """
+        interrupted = {id(node) for node in self.interrupted}
+        for node in reversed(nodes):
+            if 'uid' in node.__dict__ and id(node) not in interrupted:
+                continue
+            if getattr(node, 'lineno', None) is not None:
+                node.first_line = node.lineno
+                node.first_col = self.native_col(node.lineno, node.col_offset)
+                node.last_line = getattr(node, 'end_lineno', None)
+                if node.last_line is None:
+                    node.last_line, node.last_col = node.first_line, node.first_col
+                else:
+                    node.last_col = self.native_col(
+                        node.last_line, node.end_col_offset
+                    )
+            else:
+                children = [
+                    child for child in ast.iter_child_nodes(node)
+                    if 'uid' in child.__dict__
+                ]
+                if not children:
+                    continue
+                node.first_line, node.first_col = min(
+                    (child.first_line, child.first_col) for child in children
+                )
+                node.last_line, node.last_col = max(
+                    (child.last_line, child.last_col) for child in children
+                )
+            node.uid = (node.last_line, node.last_col)
+
+    def attach_comments(self, nodes):
+        """Attach comments to nodes as NodeWithPosition (kind is the text)
+        A block of comments on their own lines, right above a line, becomes
+        the leading_comments of the outermost node that starts this line.
+        A comment after code becomes the trailing_comment of the node that
+        ends last before it, on the same line. Among nodes that end at the
+        same position, the innermost statement is preferred to the outermost
+        node
+
+        Arguments:
+        nodes -- nodes in preorder
+        """
+        starts, ends = {}, {}
+        for node in nodes:
+            if 'first_line' not in node.__dict__ or isinstance(node, ast.mod):
+                continue
+            starts.setdefault((node.first_line, node.first_col), node)
+            ends.setdefault(node.last_line, []).append(node)
+        block = []
+        for last, first in self.comments.items():
+            line = self.lcode[first[0] - 1]
+            comment = NodeWithPosition(last, first, line[first[1]:last[1]])
+            if line[:first[1]].strip():
+                before = [
+                    node for node in ends.get(first[0], ())
+                    if node.last_col <= first[1]
+                ]
+                if before:
+                    col = max(node.last_col for node in before)
+                    before = [node for node in before if node.last_col == col]
+                    statements = [
+                        node for node in before if isinstance(node, ast.stmt)
+                    ]
+                    node = statements[-1] if statements else before[0]
+                    node.trailing_comment = comment
+                continue
+            if block and block[-1].first_line + 1 != first[0]:
+                block = []
+            block.append(comment)
+            next_line = first[0] + 1
+            if next_line > len(self.lcode):
+                continue
+            code = self.lcode[next_line - 1]
+            stripped = code.lstrip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            node = starts.get((next_line, len(code) - len(stripped)))
+            if node is not None:
+                node.leading_comments = block
+            block = []
 
     def dnode(self, node):
-        """Duplicate node and adjust it for deslocated line and column"""
+        """Duplicate node and adjust it for deslocated line and column
+        Return the node itself if there is no displacement
+        """
+        if not self.dline and not self.dcol:
+            return node
         new_node = copy(node)
         new_node.lineno += self.dline
         new_node.col_offset += self.dcol
@@ -139,39 +423,28 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         """Create new node for infixop"""
         previous_position = (previous.last_line, previous.last_col - 1)
         position = (next_node.first_line, next_node.first_col + 1)
-        possible = []
-        for ch in OPERATORS[node.__class__]:
-            try:
-                pos = self.operators[ch].find_previous(position)
-                if previous_position < pos[1] < position:
-                    possible.append((pos, ch))
-            except KeyError:
-                pass
-
-        if not possible:
-            raise ValueError("not a single {} between {} and {}".format(
-                OPERATORS[node.__class__], previous_position, position))
+        index = self.operators_by_class[node.__class__]
+        last, value = index.last_between(previous_position, position)
+        if last is not None and previous_position < value[0]:
+            return NodeWithPosition(last, value[0], value[1])
 
-        (last, first), ch = min(possible, key=lambda x: tuple(map(sub, position, x[0][0])))
-        return NodeWithPosition(last, first, ch)
+        raise ValueError("not a single {} between {} and {}".format(
+            OPERATORS[node.__class__], previous_position, position))
 
     def calculate_unaryop(self, node, next_node):
         """Create new node for unaryop"""
         position = (next_node.first_line, next_node.first_col + 1)
-        possible = []
-        for ch in OPERATORS[node.__class__]:
-            try:
-                pos = self.operators[ch].find_previous(position)
-                if pos[1] < position:
-                    possible.append((pos, ch))
-            except KeyError:
-                pass
+        last, value = self.operators_by_class[node.__class__].get_previous(position)
+        if last is not None:
+            return NodeWithPosition(last, value[0], value[1])
 
-        (last, first), ch = min(possible, key=lambda x: tuple(map(sub, position, x[0][0])))
-        return NodeWithPosition(last, first, ch)
+        raise ValueError("not a single {} before {}".format(
+            OPERATORS[node.__class__], position))
 
     def uid_something_colon(self, node, something, inclusive=False, first_child=lambda n: n.body[0]):
         """ Creates op_pos for node from uid to colon """
+        if not self.aux:
+            return None
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), something)
         ]
@@ -180,25 +453,122 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         node.op_pos.append(NodeWithPosition(last, first, ':'))
         return last
 
-    def optional_else(self, node, last):
+    def optional_else(self, node):
         """ Create op_pos for optional else """
         if node.orelse:
+            body_last = (node.body[-1].last_line, node.body[-1].last_col)
             min_first_max_last(node, node.orelse[-1])
-            if 'else' in self.operators:
+            if self.aux and 'else' in self.operators:
                 position = (node.orelse[0].first_line, node.orelse[0].first_col)
-                _, efirst = self.operators['else'].find_previous(position)
-                if efirst and efirst > last:
+                # The else of an if nested in the body is before body_last
+                _, efirst = self.operators['else'].last_between(
+                    body_last, position)
+                if efirst:
                     elast, _ = self.operators[':'].find_previous(position)
                     node.op_pos.append(NodeWithPosition(elast, efirst, 'else:'))
 
-    def comma_separated_list(self, node, subnodes):
+    def comma_separated_list(self, node, subnodes, separators=None):
         """Process comma separated list """
-        for item in subnodes:
-            position = (item.last_line, item.last_col)
-            first, last = find_next_comma(self.lcode, position)
+        if not self.aux:
+            return
+        for index, item in enumerate(subnodes):
+            if separators is None:
+                position = (item.last_line, item.last_col)
+                first, last = find_next_comma(self.lcode, position)
+            else:
+                first, last = separators[index]
             if first:  # comma exists
                 node.op_pos.append(NodeWithPosition(last, first, ','))
 
+    def visit_elements(self, node):
+        """Visit the elements of a collection
+        Constants are positioned directly, instead of visited one by one.
+        The separators after all elements are found in a single sweep
+        Return the (first, last) positions of the separators, or None if
+        they must be found one by one
+        """
+        if isinstance(node, ast.Dict):
+            if any(key is None for key in node.keys):
+                self.generic_visit(node)
+                return None
+            elements = [
+                element for pair in zip(node.keys, node.values)
+                for element in pair
+            ]
+            kinds = (':', ',')
+        else:
+            elements, kinds = node.elts, (',',)
+        if len(elements) < 2 or not ge_python38:
+            self.generic_visit(node)
+            return None
+        self.check_deadline()
+        constants = []
+        for element in elements:
+            if type(element) is ast.Constant and self.constant_position(element):
+                constants.append(element)
+            else:
+                self.visit(element)
+        separators = self.sweep_separators(elements, kinds)
+        if separators is None:
+            # Parenthesized constants or comments between elements
+            for element in constants:
+                self.visit(element)
+        return separators
+
+    def constant_position(self, node):
+        """Position a Constant without visiting it. It is only correct if
+        the constant is not parenthesized. Return False for other constants
+        """
+        value = node.value
+        if isinstance(value, (str, bytes)):
+            LineProvenanceVisitor.visit_Str.__wrapped__(self, node)
+        elif value is None or value is True or value is False:
+            LineProvenanceVisitor.visit_NameConstant.__wrapped__(self, node)
+        elif isinstance(value, (int, float, complex)):
+            LineProvenanceVisitor.visit_Num.__wrapped__(self, node)
+        else:
+            return False
+        return True
+
+    def sweep_separators(self, elements, kinds):
+        """Find the separator after each element
+        Separators alternate between kinds. The gaps between elements must
+        have only whitespaces and the separator. The separator after the
+        last element is optional (e.g., trailing comma)
+        Return None if a gap has anything else (e.g., parenthesis, comments)
+        """
+        lines = self.lcode
+        result = []
+        nkinds = len(kinds)
+        for index, (element, following) in enumerate(pairwise(elements)):
+            kind = kinds[index % nkinds]
+            line, col = element.last_line, element.last_col
+            first_line, first_col = following.first_line, following.first_col
+            text = lines[line - 1]
+            if first_line == line:
+                gap = text[col:first_col]
+            else:
+                gap = '\n'.join(
+                    [text[col:]] + lines[line:first_line - 1] +
+                    [lines[first_line - 1][:first_col]]
+                )
+            if gap.strip(GAP_WHITESPACE) != kind:
+                return None
+            offset = gap.index(kind)
+            before = gap.count('\n', 0, offset)
+            if before:
+                line += before
+                col = offset - gap.rindex('\n', 0, offset) - 1
+            else:
+                col += offset
+            result.append(((line, col), (line, col + 1)))
+        last = elements[-1]
+        result.append(find_next_character(
+            lines, (last.last_line, last.last_col),
+            kinds[(len(elements) - 1) % nkinds]
+        ))
+        return result
+
     @visit_expr
     def visit_Name(self, node):
         nnode = self.dnode(node)
@@ -232,6 +602,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
                     value.bracket[0][0],
                     value.bracket[0][1] + 1,
                 )
+                if not self.aux:
+                    del value.bracket
 
             else:
                 self.visit(value)
@@ -244,7 +616,7 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         self.visit(node.value)
         if node.format_spec:
             self.visit(node.format_spec)
-        update_expr_parenthesis(self.lcode, self.parenthesis, node)
+        update_expr_parenthesis(self.parenthesis_layers, node, self.aux)
 
     @ge_python36
     @visit_expr
@@ -274,8 +646,12 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         position = (node.last_line, node.last_col)
         last, _ = self.names[node.attr].find_next(position)
         node.last_line, node.last_col = last
+        if not self.uids:
+            node.uid = last
+            return
         node.uid, first_dot = self.operators['.'].find_next(position)
-        node.op_pos = [NodeWithPosition(node.uid, first_dot, '.')]
+        if self.aux:
+            node.op_pos = [NodeWithPosition(node.uid, first_dot, '.')]
 
     @lt_python39
     @visit_all
@@ -293,26 +669,27 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_all_if_condition_else_expr(lt_python39)
     def visit_Slice(self, node):
         set_max_position(node)
-        children = [node.lower, node.upper, node.step]
-        node.children = [x for x in children if x]
+        children = [
+            x for x in (node.lower, node.upper, node.step) if x
+        ]
+        if self.aux:
+            node.children = children
+            node.op_pos = []
 
         if isinstance(node.step, ast.Name) and node.step.id == 'None':
             position = (node.step.first_line, node.step.first_col - 1)
             empty_none = True
-            try:
-                last, first = self.operators['None'].find_next(position)
+            if 'None' in self.operators:
+                _, first = self.operators['None'].get_next(position)
                 if first == (node.step.first_line, node.step.first_col):
                     empty_none = False
-            except (KeyError, IndexError):
-                pass
             if empty_none:
                 node.step.last_col = self.dnode(node.step).col_offset + 1
                 node.step.uid = (node.step.last_line, node.step.last_col)
 
-        node.op_pos = []
-        for sub_node in node.children:
+        for sub_node in children:
             min_first_max_last(node, sub_node)
-        if not node.children and ge_python39:
+        if not children and ge_python39:
             node.first_line, node.first_col = node.lineno, node.col_offset
             node.last_line, node.last_col = node.end_lineno, node.end_col_offset
 
@@ -363,19 +740,20 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
         if isinstance(previous, ext_slice):
             self.post_process_slice(previous.dims[-1], position)
-            previous.op_pos = []
-            self.comma_separated_list(previous, previous.dims)
+            if self.aux:
+                previous.op_pos = []
+                self.comma_separated_list(previous, previous.dims)
         if isinstance(previous, ast.Slice) or may_have_leading_colon:
             new_position = self.operators[':'].find_previous(position)[0]
             if new_position > (previous.last_line, previous.last_col):
                 previous.last_line, previous.last_col = new_position
 
-        if isinstance(previous, ast.Slice):
+        if self.aux and isinstance(previous, ast.Slice):
             if ':' in self.operators:
                 start = (previous.first_line, previous.first_col)
                 position = inc_tuple((previous.last_line, previous.last_col))
                 for _ in range(2):
-                    clast, cfirst = self.operators[':'].find_previous(position)
+                    clast, cfirst = self.operators[':'].get_previous(position)
                     if cfirst and cfirst >= start:
                         previous.op_pos.append(NodeWithPosition(clast, cfirst, ':'))
                         position = inc_tuple(cfirst)
@@ -389,40 +767,47 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         position = (node.value.last_line, node.value.last_col)
         first, last = self.sbrackets.find_next(position)
         set_pos(node, first, last)
-        node.op_pos = [
-            NodeWithPosition(inc_tuple(first), first, '['),
-            NodeWithPosition(last, dec_tuple(last), ']'),
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(inc_tuple(first), first, '['),
+                NodeWithPosition(last, dec_tuple(last), ']'),
+            ]
         node.first_line = node.value.first_line
         node.first_col = node.value.first_col
         self.post_process_slice(node.slice, node.uid)
 
-    @visit_expr
-    def visit_Tuple(self, node):
-        node.op_pos = []
+    @visit_collection
+    def visit_Tuple(self, node, separators):
+        op_pos = []
+        if self.aux:
+            node.op_pos = op_pos
         if not node.elts:
             position = self.dposition(node, dcol=1)
             set_pos(node, *self.parenthesis.find_previous(position))
         else:
             set_uid = None
             set_max_position(node)
-            for elt in node.elts:
+            for index, elt in enumerate(node.elts):
                 min_first_max_last(node, elt)
-                position = (elt.last_line, elt.last_col)
-                first, last = find_next_comma(self.lcode, position)
+                if separators is None:
+                    position = (elt.last_line, elt.last_col)
+                    first, last = find_next_comma(self.lcode, position)
+                else:
+                    first, last = separators[index]
                 if first:
                     # comma exists
-                    node.op_pos.append(NodeWithPosition(last, first, ','))
+                    op_pos.append(NodeWithPosition(last, first, ','))
                     set_uid = set_uid or first
-                    min_first_max_last(node, node.op_pos[-1])
+                    min_first_max_last(node, op_pos[-1])
             node.uid = set_uid or (node.elts[0].last_line, node.elts[0].last_col)
 
-    @visit_expr
-    def visit_List(self, node):
+    @visit_collection
+    def visit_List(self, node, separators):
         position = self.dposition(node, dcol=1)
         set_pos(node, *self.sbrackets.find_previous(position))
-        node.op_pos = []
-        self.comma_separated_list(node, node.elts)
+        if self.aux:
+            node.op_pos = []
+            self.comma_separated_list(node, node.elts, separators)
 
     @visit_expr
     def visit_Repr(self, node):
@@ -432,18 +817,21 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         position = (node.value.first_line, node.value.first_col + 1)
         first = self.operators['`'].find_previous(position)[1]
         node.first_line, node.first_col = first
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition((node.first_line, node.first_col + 1), first, '`'),
             NodeWithPosition(node.uid, (node.last_line, node.last_col - 1), '`'),
         ]
 
     def visit_call_like(self, node, children, func=lambda x: x.func):
-        node.op_pos = []
         copy_info(node, func(node))
         position = (node.last_line, node.last_col)
         first, last = self.parenthesis.find_next(position)
-        node.op_pos.append(NodeWithPosition(inc_tuple(first), first, '('))
         node.uid = node.last_line, node.last_col = last
+        if not self.aux:
+            return
+        node.op_pos = [NodeWithPosition(inc_tuple(first), first, '(')]
 
         for child in children:
             position = (child[1].last_line, child[1].last_col)
@@ -478,16 +866,18 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_expr
     def visit_Compare(self, node):
-        node.op_pos = []
+        if self.aux:
+            node.op_pos = []
         set_max_position(node)
 
         min_first_max_last(node, node.left)
         previous = node.left
         for i, comparator in enumerate(node.comparators):
             # Cannot set to the cmpop node as they are singletons
-            node.op_pos.append(
-                self.calculate_infixop(node.ops[i], previous, comparator)
-            )
+            if self.aux:
+                node.op_pos.append(
+                    self.calculate_infixop(node.ops[i], previous, comparator)
+                )
             min_first_max_last(node, comparator)
             previous = comparator
 
@@ -497,18 +887,24 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_Await(self, node):
         start_by_keyword(node, self.operators['await'], self.bytes_pos_to_utf8)
         min_first_max_last(node, node.value)
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'await')
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(
+                    node.uid, (node.first_line, node.first_col), 'await'
+                )
+            ]
 
     @visit_expr
     def visit_Yield(self, node):
         start_by_keyword(node, self.operators['yield'], self.bytes_pos_to_utf8)
         if node.value:
             min_first_max_last(node, node.value)
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'yield')
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(
+                    node.uid, (node.first_line, node.first_col), 'yield'
+                )
+            ]
 
     @visit_all
     def visit_comprehension(self, node):
@@ -519,15 +915,18 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         else:
             r_set_previous_element(node, node.target, self.operators['for'], inclusive=True)
             kind = 'for'
+        min_first_max_last(node, node.iter)
+        for eif in node.ifs:
+            min_first_max_last(node, eif)
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), kind)
         ]
-        min_first_max_last(node, node.iter)
         position = (node.iter.first_line, node.iter.first_col)
         last, first = self.operators['in'].find_previous(position, inclusive=True)
         node.op_pos.append(NodeWithPosition(last, first, 'in'))
         for eif in node.ifs:
-            min_first_max_last(node, eif)
             position = dec_tuple((eif.first_line, eif.first_col))
             last, first = self.operators['if'].find_next(position)
             node.op_pos.append(NodeWithPosition(last, first, 'if'))
@@ -552,37 +951,52 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_ListComp(self, node):
         set_previous_element(node, node.elt, self.sbrackets)
 
-    @visit_expr
-    def visit_Set(self, node):
+    @visit_collection
+    def visit_Set(self, node, separators):
         set_previous_element(node, node.elts[0], self.brackets)
-        node.op_pos = []
-        self.comma_separated_list(node, node.elts)
+        if self.aux:
+            node.op_pos = []
+            self.comma_separated_list(node, node.elts, separators)
 
-    def visit_dict_like(self, node, keys=lambda x: x.keys, values=lambda x: x.values):
-        node.op_pos = []
+    def visit_dict_like(self, node, keys=lambda x: x.keys, values=lambda x: x.values,
+                        separators=None):
         position = self.dposition(node, dcol=1)
         set_pos(node, *self.brackets.find_previous(position))
-        for key, value in zip(keys(node), values(node)):
-            position = (key.last_line, key.last_col)
-            first, last = find_next_colon(self.lcode, position)
+        if not self.aux:
+            return
+        node.op_pos = []
+        for index, (key, value) in enumerate(zip(keys(node), values(node))):
+            if separators is None:
+                position = (key.last_line, key.last_col)
+                first, last = find_next_colon(self.lcode, position)
+            else:
+                first, last = separators[2 * index]
             node.op_pos.append(NodeWithPosition(last, first, ':'))
 
-            position = (value.last_line, value.last_col)
-            first, last = find_next_comma(self.lcode, position)
+            if separators is None:
+                position = (value.last_line, value.last_col)
+                first, last = find_next_comma(self.lcode, position)
+            else:
+                first, last = separators[2 * index + 1]
             if first:  # comma exists
                 node.op_pos.append(NodeWithPosition(last, first, ','))
 
-    @visit_expr
-    def visit_Dict(self, node):
-        self.visit_dict_like(node)
+    @visit_collection
+    def visit_Dict(self, node, separators):
+        self.visit_dict_like(node, separators=separators)
 
     @visit_expr
     def visit_IfExp(self, node):
         set_max_position(node)
         min_first_max_last(node, node.body)
         min_first_max_last(node, node.orelse)
+        if not self.uids:
+            node.uid = node.last_line, node.last_col
+            return
         position = (node.test.first_line, node.test.first_col + 1)
         node.uid = self.operators['if'].find_previous(position, inclusive=True)[0]
+        if not self.aux:
+            return
         else_pos = self.operators['else'].find_next(position, inclusive=True)[0]
         node.op_pos = [
             NodeWithPosition(node.uid, (node.uid[0], node.uid[1] - 2), 'if'),
@@ -602,20 +1016,23 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         after_lambda, first = self.operators['lambda'].find_previous(position)
         node.first_line, node.first_col = first
         self.update_arguments(node.args, after_lambda, before_colon)
-        node.op_pos = [
-            NodeWithPosition(after_lambda, first, 'lambda'),
-            NodeWithPosition(node.uid, before_colon, ':'),
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(after_lambda, first, 'lambda'),
+                NodeWithPosition(node.uid, before_colon, ':'),
+            ]
 
     @visit_all
     def visit_arg(self, node):
         nnode = self.dnode(node)
-        node.op_pos = []
+        if self.aux:
+            node.op_pos = []
         if node.annotation:
             copy_info(node, node.annotation)
-            position = (node.first_line, node.first_col)
-            last, first = self.operators[':'].find_previous(position)
-            node.op_pos.append(NodeWithPosition(last, first, ':'))
+            if self.aux:
+                position = (node.first_line, node.first_col)
+                last, first = self.operators[':'].find_previous(position)
+                node.op_pos.append(NodeWithPosition(last, first, ':'))
         else:
             node.last_line = nnode.lineno
             node.last_col = nnode.col_offset + len(node.arg)
@@ -631,27 +1048,23 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_arguments(self, node):
-        node.op_pos = []
-
         if hasattr(node, 'kwonlyargs'):  # Python 3
-            node.vararg_node = node.vararg
-            node.kwarg_node = node.kwarg
+            vararg_node, kwarg_node = node.vararg, node.kwarg
         else:
             set_max_position(node)
             for arg in node.args:
                 min_first_max_last(node, arg)
 
-            node.vararg_node = None
-            node.kwarg_node = None
+            vararg_node = kwarg_node = None
             position = (node.first_line, node.first_col)
 
             if node.vararg:
                 last, first = self.names[node.vararg].find_next(position)
-                node.vararg_node = NodeWithPosition(last, first, '<vararg>')
+                vararg_node = NodeWithPosition(last, first, '<vararg>')
 
             if node.kwarg:
                 last, first = self.names[node.kwarg].find_next(position)
-                node.kwarg_node = NodeWithPosition(last, first, '<kwarg>')
+                kwarg_node = NodeWithPosition(last, first, '<kwarg>')
 
 
         set_max_position(node)
@@ -660,7 +1073,19 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         for arg in node.defaults:
             min_first_max_last(node, arg)
 
-        
+        if not self.aux:
+            others = [vararg_node, kwarg_node]
+            others += getattr(node, 'kwonlyargs', [])
+            others += getattr(node, 'kw_defaults', [])
+            for arg in others:
+                if arg:
+                    min_first_max_last(node, arg)
+            node.uid = (node.last_line, node.last_col)
+            return
+        node.op_pos = []
+        node.vararg_node = vararg_node
+        node.kwarg_node = kwarg_node
+
         if len(node.defaults) >= len(node.args):
             pos_args = []
             args_with_defaults = zip(node.args, node.defaults[-len(node.args):])
@@ -741,27 +1166,54 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_expr
     def visit_UnaryOp(self, node):
         # Cannot set to the unaryop node as they are singletons
-        node.op_pos = [self.calculate_unaryop(node.op, node.operand)]
-        copy_info(node, node.op_pos[0])
+        operator = self.calculate_unaryop(node.op, node.operand)
+        copy_info(node, operator)
+        if self.aux:
+            node.op_pos = [operator]
         min_first_max_last(node, node.operand)
 
-    @visit_expr
     def visit_BinOp(self, node):
+        """Visit BinOp chains (e.g., a + b + c + ...) with a stack instead of
+        recursion. Operands that are not BinOp nodes are visited by visit
+        """
+        stack = [(False, node)]
+        while stack:
+            operands_visited, current = stack.pop()
+            if operands_visited:
+                self.binop_position(current)
+            elif not isinstance(current, ast.BinOp):
+                self.visit(current)
+            else:
+                if current is not node and self.deadline is not None:
+                    self.check_deadline()
+                stack.append((True, current))
+                stack.append((False, current.right))
+                stack.append((False, current.left))
+
+    def binop_position(self, node):
+        """Position a BinOp node after its operands"""
         set_max_position(node)
         min_first_max_last(node, node.left)
         min_first_max_last(node, node.right)
-        node.op_pos = [self.calculate_infixop(node.op, node.left, node.right)]
-        node.uid = node.op_pos[0].uid
+        if not self.uids:
+            node.uid = node.last_line, node.last_col
+        else:
+            operator = self.calculate_infixop(node.op, node.left, node.right)
+            node.uid = operator.uid
+            if self.aux:
+                node.op_pos = [operator]
+        update_expr_parenthesis(self.parenthesis_layers, node, self.aux)
 
     @visit_expr
     def visit_BoolOp(self, node):
-        node.op_pos = []
+        if self.aux:
+            node.op_pos = []
         set_max_position(node)
 
         previous = None
         for value in node.values:
             # Cannot set to the boolop nodes as they are singletons
-            if previous:
+            if previous and self.aux:
                 node.op_pos.append(
                     self.calculate_infixop(node.op, previous, value)
                 )
@@ -777,9 +1229,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         r_set_pos(node, *self.operators['*'].find_previous(position))
         last = node.value
         node.last_line, node.last_col = last.last_line, last.last_col
-        node.op_pos = [
-            NodeWithPosition(node.uid, dec_tuple(node.uid), '*')
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(node.uid, dec_tuple(node.uid), '*')
+            ]
 
     @visit_expr
     def visit_NameConstant(self, node):
@@ -799,9 +1252,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         position = self.dposition(node)
         node.uid, first = self.operators['yield from'].find_next(position)
         node.first_line, node.first_col = first
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'yield from')
-        ]
+        if self.aux:
+            node.op_pos = [NodeWithPosition(node.uid, first, 'yield from')]
 
     @visit_stmt
     def visit_Pass(self, node):
@@ -828,26 +1280,38 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_stmt
     def visit_Nonlocal(self, node):
         keyword_followed_by_ids(node, self.operators['nonlocal'], self.names,
-                                node.names, self.bytes_pos_to_utf8)
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'nonlocal')
-        ]
-        self.comma_separated_list(node, node.ids_pos)
+                                node.names, self.bytes_pos_to_utf8, self.aux)
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(
+                    node.uid, (node.first_line, node.first_col), 'nonlocal'
+                )
+            ]
+            self.comma_separated_list(node, node.ids_pos)
 
     @visit_stmt
     def visit_Global(self, node, op='global'):
         keyword_followed_by_ids(node, self.operators['global'], self.names,
-                                node.names, self.bytes_pos_to_utf8)
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'global')
-        ]
-        self.comma_separated_list(node, node.ids_pos)
+                                node.names, self.bytes_pos_to_utf8, self.aux)
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(
+                    node.uid, (node.first_line, node.first_col), 'global'
+                )
+            ]
+            self.comma_separated_list(node, node.ids_pos)
 
     @visit_stmt
     def visit_Exec(self, node):
         copy_info(node, node.body)
         start_by_keyword(node, self.operators['exec'],
                          self.bytes_pos_to_utf8, set_last=False)
+        if node.globals:
+            min_first_max_last(node, node.globals)
+        if node.locals:
+            min_first_max_last(node, node.locals)
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), 'exec')
         ]
@@ -856,15 +1320,14 @@ class LineProvenanceVisitor(ast.NodeVisitor):
             position = self.dposition(node.globals)
             last, first = self.operators['in'].find_previous(position)
             node.op_pos.append(NodeWithPosition(last, first, 'in'))
-            min_first_max_last(node, node.globals)
         if node.locals:
             position = self.dposition(node.locals)
             last, first = self.operators[','].find_previous(position)
             node.op_pos.append(NodeWithPosition(last, first, ','))
-            min_first_max_last(node, node.locals)
 
     def process_alias(self, position, alias):
-        alias.op_pos = []
+        if self.aux:
+            alias.op_pos = []
         splitted = alias.name.split('.')
         first = None
         for subname in splitted:
@@ -874,8 +1337,9 @@ class LineProvenanceVisitor(ast.NodeVisitor):
                 first = p1
         if alias.asname:
             last, _ = self.names[alias.asname].find_next(last)
-            alast, afirst = self.operators["as"].find_previous(last)
-            alias.op_pos.append(NodeWithPosition(alast, afirst, 'as'))
+            if self.aux:
+                alast, afirst = self.operators["as"].find_previous(last)
+                alias.op_pos.append(NodeWithPosition(alast, afirst, 'as'))
         alias.first_line, alias.first_col = first
         alias.uid = alias.last_line, alias.last_col = last
         return last
@@ -885,10 +1349,11 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         start_by_keyword(node, self.operators['from'], self.bytes_pos_to_utf8)
         last = node.uid
         last, first = self.operators['import'].find_next(last)
-        node.op_pos = [
-            NodeWithPosition(node.uid, self.dposition(node), 'from'),
-            NodeWithPosition(last, first, 'import'),
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(node.uid, self.dposition(node), 'from'),
+                NodeWithPosition(last, first, 'import'),
+            ]
         for alias in node.names:
             last = self.process_alias(last, alias)
         par = find_next_parenthesis(self.lcode, last, self.parenthesis)
@@ -900,9 +1365,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_Import(self, node):
         start_by_keyword(node, self.operators['import'],
                          self.bytes_pos_to_utf8)
-        node.op_pos = [
-            NodeWithPosition(node.uid, self.dposition(node), 'import'),
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(node.uid, self.dposition(node), 'import'),
+            ]
         last = node.uid
         for alias in node.names:
             last = self.process_alias(last, alias)
@@ -913,11 +1379,14 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         copy_info(node, node.test)
         start_by_keyword(node, self.operators['assert'],
                          self.bytes_pos_to_utf8, set_last=False)
+        if node.msg:
+            min_first_max_last(node, node.msg)
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, self.dposition(node), 'assert'),
         ]
         if node.msg:
-            min_first_max_last(node, node.msg)
             position = self.dposition(node.msg)
             last, first = self.operators[','].find_previous(position)
             node.op_pos.append(NodeWithPosition(last, first, ','))
@@ -926,6 +1395,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_TryFinally(self, node):
         start_by_keyword(node, self.operators['try'], self.bytes_pos_to_utf8)
         min_first_max_last(node, node.finalbody[-1])
+        if not self.aux:
+            return
         position = node.uid
         last, _ = self.operators[':'].find_next(position)
         body = node.body
@@ -944,6 +1415,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_stmt
     def visit_TryExcept(self, node):
         start_by_keyword(node, self.operators['try'], self.bytes_pos_to_utf8)
+        if not self.aux:
+            for child in node.handlers + node.orelse[-1:]:
+                min_first_max_last(node, child)
+            return
         position = node.uid
         last, _ = self.operators[':'].find_next(position)
         node.op_pos = [
@@ -964,6 +1439,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         start_by_keyword(node, self.operators['except'],
                          self.bytes_pos_to_utf8)
         min_first_max_last(node, node.body[-1])
+        if not self.aux:
+            return
         self.uid_something_colon(node, 'except')
 
         node.name_node = node.name
@@ -976,10 +1453,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
             position = (node.name_node.first_line, node.name_node.first_col)
             first = None
             if 'as' in self.operators:
-                last, first = self.operators["as"].find_previous(position)
+                last, first = self.operators["as"].last_between(node_position, position)
                 kind = 'as'
             if not first:
-                last, first = self.operators[","].find_previous(position)
+                last, first = self.operators[","].last_between(node_position, position)
                 kind = ','
             if first and first > node_position:
                 node.op_pos.insert(1, NodeWithPosition(last, first, kind))
@@ -987,6 +1464,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_stmt
     def visit_Try(self, node):
         start_by_keyword(node, self.operators['try'], self.bytes_pos_to_utf8)
+        if not self.aux:
+            for child in node.handlers + node.orelse[-1:] + node.finalbody[-1:]:
+                min_first_max_last(node, child)
+            return
         position = node.uid
         last, _ = self.operators[':'].find_next(position)
         node.op_pos = [
@@ -1015,15 +1496,18 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_stmt
     def visit_Raise(self, node):
         start_by_keyword(node, self.operators['raise'], self.bytes_pos_to_utf8)
-        node.op_pos = [
-            NodeWithPosition(node.uid, self.dposition(node), 'raise'),
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(node.uid, self.dposition(node), 'raise'),
+            ]
         if 'type' in dir(node):  # Python 2
             children = [node.type, node.inst, node.tback]
             for child in children:
                 if not child:
                     continue
                 min_first_max_last(node, child)
+                if not self.aux:
+                    continue
                 position = (child.last_line, child.last_col)
                 first, last = find_next_comma(self.lcode, position)
                 if first: # comma exists
@@ -1035,7 +1519,7 @@ class LineProvenanceVisitor(ast.NodeVisitor):
                 if not child:
                     continue
                 min_first_max_last(node, child)
-            if node.cause:
+            if node.cause and self.aux:
                 position = self.dposition(node.cause)
                 last, first = self.operators['from'].find_previous(position)
                 node.op_pos.append(NodeWithPosition(last, first, 'from'))
@@ -1044,6 +1528,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_With(self, node, keyword='with'):
         start_by_keyword(node, self.operators[keyword], self.bytes_pos_to_utf8)
         min_first_max_last(node, node.body[-1])
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), keyword)
         ]
@@ -1077,9 +1563,12 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_all
     def visit_withitem(self, node):
         copy_info(node, node.context_expr)
-        node.op_pos = []
         if node.optional_vars:
             min_first_max_last(node, node.optional_vars)
+        if not self.aux:
+            return
+        node.op_pos = []
+        if node.optional_vars:
             var = node.optional_vars
             position = (var.first_line, var.first_col)
             last, first = self.operators['as'].find_previous(position)
@@ -1089,15 +1578,15 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_If(self, node, keyword='if'):
         start_by_keyword(node, self.operators['if'], self.bytes_pos_to_utf8, inclusive=True)
         min_first_max_last(node, node.body[-1])
-        last = self.uid_something_colon(node, 'elif' if node.uid[1] - node.first_col == 4 else 'if')
-        self.optional_else(node, last)
+        self.uid_something_colon(node, 'elif' if node.uid[1] - node.first_col == 4 else 'if')
+        self.optional_else(node)
 
     @visit_stmt
     def visit_While(self, node):
         start_by_keyword(node, self.operators['while'], self.bytes_pos_to_utf8, inclusive=True)
         min_first_max_last(node, node.body[-1])
-        last = self.uid_something_colon(node, 'while')
-        self.optional_else(node, last)
+        self.uid_something_colon(node, 'while')
+        self.optional_else(node)
 
     @visit_stmt
     def visit_For(self, node, keyword='for', delta=(0, 0)):
@@ -1106,11 +1595,12 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         start_by_keyword(node, self.operators['for'], self.bytes_pos_to_utf8,  inclusive=True, delta=delta)
         node.first_line, node.first_col = first
         min_first_max_last(node, node.body[-1])
-        last = self.uid_something_colon(node, 'for' if keyword == 'for' else keyword + ' for')
-        position = (node.iter.first_line, node.iter.first_col)
-        last, first = self.operators['in'].find_previous(position, inclusive=True)
-        node.op_pos.insert(1, NodeWithPosition(last, first, 'in'))
-        self.optional_else(node, last)
+        self.uid_something_colon(node, 'for' if keyword == 'for' else keyword + ' for')
+        if self.aux:
+            position = (node.iter.first_line, node.iter.first_col)
+            last, first = self.operators['in'].find_previous(position, inclusive=True)
+            node.op_pos.insert(1, NodeWithPosition(last, first, 'in'))
+        self.optional_else(node)
 
     def visit_AsyncFor(self, node):
         """ Python 3.5 """
@@ -1121,19 +1611,22 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_Print(self, node):
         """ Python 2 """
         start_by_keyword(node, self.operators['print'], self.bytes_pos_to_utf8)
+        if node.dest:
+            min_first_max_last(node, node.dest)
+        if node.values:
+            min_first_max_last(node, node.values[-1])
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), 'print')
         ]
         subnodes = []
         if node.dest:
-            min_first_max_last(node, node.dest)
             position = (node.dest.first_line, node.dest.first_col)
             last, first = self.operators['>>'].find_previous(position)
             node.op_pos.append(NodeWithPosition(last, first, '>>'))
             subnodes.append(node.dest)
-        if node.values:
-            min_first_max_last(node, node.values[-1])
-            subnodes.extend(node.values)
+        subnodes.extend(node.values)
 
         self.comma_separated_list(node, subnodes)
 
@@ -1142,40 +1635,51 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         set_max_position(node)
         min_first_max_last(node, node.target)
         min_first_max_last(node, node.value)
-        node.op_pos = [self.calculate_infixop(node.op, node.target, node.value)]
-        node.uid = node.op_pos[0].uid
+        if not self.uids:
+            node.uid = node.last_line, node.last_col
+            return
+        operator = self.calculate_infixop(node.op, node.target, node.value)
+        node.uid = operator.uid
+        if self.aux:
+            node.op_pos = [operator]
 
     @visit_stmt
     def visit_AnnAssign(self, node):
         set_max_position(node)
         min_first_max_last(node, node.target)
         min_first_max_last(node, node.annotation)
-        node.op_pos = []
-        node.op_pos.append(
-            self.calculate_infixop(node, node.target, node.annotation)
-        )
         if node.value:
             min_first_max_last(node, node.value)
+        if not self.uids:
+            node.uid = node.last_line, node.last_col
+            return
+        operator = self.calculate_infixop(node, node.target, node.annotation)
+        node.uid = operator.uid
+        if not self.aux:
+            return
+        node.op_pos = [operator]
+        if node.value:
             node.op_pos.append(
                 self.calculate_infixop(node, node.annotation, node.value)
             )
 
-        node.uid = node.op_pos[0].uid
-
     @visit_stmt
     def visit_Assign(self, node):
-        node.op_pos = []
+        if self.aux:
+            node.op_pos = []
         set_max_position(node)
 
         min_first_max_last(node, node.value)
         last = node.value
         for i, target in reversed(list(enumerate(node.targets))):
-            node.op_pos.append(
-                self.calculate_infixop(node, target, last)
-            )
+            if self.aux:
+                node.op_pos.append(
+                    self.calculate_infixop(node, target, last)
+                )
             min_first_max_last(node, target)
             last = target
-        node.op_pos = list(reversed(node.op_pos))
+        if self.aux:
+            node.op_pos.reverse()
 
         node.uid = node.last_line, node.last_col
 
@@ -1185,27 +1689,36 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         for target in node.targets:
             min_first_max_last(node, target)
 
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'del')
-        ]
-        self.comma_separated_list(node, node.targets)
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(node.uid, (node.first_line, node.first_col), 'del')
+            ]
+            self.comma_separated_list(node, node.targets)
 
     @visit_stmt
     def visit_Return(self, node):
         start_by_keyword(node, self.operators['return'],
                          self.bytes_pos_to_utf8)
-        node.op_pos = [
-            NodeWithPosition(node.uid, (node.first_line, node.first_col), 'return')
-        ]
+        if self.aux:
+            node.op_pos = [
+                NodeWithPosition(
+                    node.uid, (node.first_line, node.first_col), 'return'
+                )
+            ]
         if node.value:
             min_first_max_last(node, node.value)
 
     def adjust_decorator(self, node, dec):
         position = dec.first_line, dec.first_col
-        last, first = self.operators['@'].find_previous(position)
+        # The @ ends at or before the decorator, on the same line
+        last, first = self.operators['@'].last_between(
+            (dec.first_line, 0), inc_tuple(position))
+        if last is None:
+            return
         if (node.first_line, node.first_col) == position:
             node.first_line, node.first_col = first
-        node.op_pos.insert(-2, NodeWithPosition(last, first, '@'))
+        if self.aux:
+            node.op_pos.insert(-2, NodeWithPosition(last, first, '@'))
 
     @visit_stmt
     def visit_ClassDef(self, node):
@@ -1222,6 +1735,12 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
         min_first_max_last(node, node.body[-1])
 
+        len_keywords = len(getattr(node, "keywords", []))
+        if len(node.bases) == 1 and len_keywords == 0:
+            increment_node_position(self.lcode, node.bases[0])
+        if not self.aux:
+            return
+
         position = (node.first_line, node.first_col)
         last, first = self.names[node.name].find_next(position)
         last_so_far = node.name_node = NodeWithPosition(last, first, '<name>')
@@ -1237,22 +1756,20 @@ class LineProvenanceVisitor(ast.NodeVisitor):
             node.op_pos.insert(-1, NodeWithPosition(inc_tuple(first), first, '('))
             node.op_pos.insert(-1, NodeWithPosition(last, dec_tuple(last), ')'))
 
-        len_keywords = len(getattr(node, "keywords", []))
-        if len(node.bases) == 1 and len_keywords == 0:
-            increment_node_position(self.lcode, node.bases[0])
-
     @visit_all
     def visit_keyword(self, node):
         copy_info(node, node.value)
-        node.op_pos = []
         position = (node.first_line, node.first_col + 1)
         if node.arg:
             node.uid, first = self.operators['='].find_previous(position)
-            node.op_pos.append(NodeWithPosition(node.uid, first, '='))
-            _, first = self.names[node.arg].find_previous(first)
+            kind = '='
         else:
             node.uid, first = self.operators['**'].find_previous(position)
-            node.op_pos.append(NodeWithPosition(node.uid, first, '**'))
+            kind = '**'
+        if self.aux:
+            node.op_pos = [NodeWithPosition(node.uid, first, kind)]
+        if node.arg:
+            _, first = self.names[node.arg].find_previous(first)
         node.first_line, node.first_col = first
 
     @visit_stmt
@@ -1272,6 +1789,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
         min_first_max_last(node, node.body[-1])
         node.lineno = lineno
+        if not self.aux:
+            return
 
         last, first = self.names[node.name].find_next(first)
         node.name_node = NodeWithPosition(last, first, '<name>')
@@ -1309,11 +1828,13 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         set_max_position(node)
         min_first_max_last(node, node.target)
         min_first_max_last(node, node.value)
-        node.op_pos = []
-        node.op_pos.append(
-            self.calculate_infixop(node, node.target, node.value)
-        )
-        node.uid = node.op_pos[0].uid
+        if not self.uids:
+            node.uid = node.last_line, node.last_col
+            return
+        operator = self.calculate_infixop(node, node.target, node.value)
+        node.uid = operator.uid
+        if self.aux:
+            node.op_pos = [operator]
 
     @visit_mod
     def visit_Module(self, node):
@@ -1355,7 +1876,7 @@ class LineProvenanceVisitor(ast.NodeVisitor):
         node.lineno, node.col_offset = node.first_line, node.first_col
         start_by_keyword(node, self.operators['case'], self.bytes_pos_to_utf8, inclusive=True, set_last=False)
         self.uid_something_colon(node, 'case')
-        if node.guard:
+        if node.guard and self.aux:
             last, first = self.operators['if'].find_previous(
                 (node.op_pos[-1].last_line, node.op_pos[-1].last_col)
             )
@@ -1366,6 +1887,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_MatchSequence(self, node):
+        if not self.aux:
+            return
         node.op_pos = []
         for pattern in node.patterns:
             position = (pattern.last_line, pattern.last_col)
@@ -1376,6 +1899,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_all
     def visit_MatchMapping(self, node):
         self.visit_dict_like(node, values=lambda x: x.patterns)
+        if not self.aux:
+            return
         node_position = (node.first_line, node.first_col)
         #node_position = (node.patterns[-1].first_line, node.patterns[-1].first_col)
         if node.rest:
@@ -1393,7 +1918,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_MatchClass(self, node):
         children = []
         children += [['patterns', x] for x in node.patterns]
-        for attr, pattern_node in zip(node.kwd_attrs, node.kwd_patterns):
+        kwd_attrs = node.kwd_attrs if self.aux else ()
+        for attr, pattern_node in zip(kwd_attrs, node.kwd_patterns):
             last, first = self.names[attr].find_previous(
                 (pattern_node.first_line, pattern_node.first_col)
             )
@@ -1408,6 +1934,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_MatchStar(self, node):
+        if not self.aux:
+            return
         first = (node.first_line, node.first_col)
         node.op_pos = [NodeWithPosition(inc_tuple(first), first, '*')]
         last, first = self.names[node.name or '_'].find_next(first)
@@ -1415,6 +1943,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_MatchAs(self, node):
+        if not self.aux:
+            return
         last = (node.last_line, node.last_col)
         first = (node.first_line, node.first_col)
         if node.pattern is None:
@@ -1428,10 +1958,12 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_MatchOr(self, node):
-        node.op_pos = []
         first = node.patterns[0]
         position = (first.last_line, first.last_col)
         last, node.uid = self.operators['|'].find_next(position)
+        if not self.aux:
+            return
+        node.op_pos = []
         for pattern in node.patterns:
             position = (pattern.last_line, pattern.last_col)
             first, last = find_next_pipe(self.lcode, position)
@@ -1451,6 +1983,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     @visit_stmt
     def visit_TypeAlias(self, node):
         start_by_keyword(node, self.operators['type'], self.bytes_pos_to_utf8, inclusive=True, set_last=False)
+        if not self.aux:
+            return
         node.op_pos = [
             NodeWithPosition(node.uid, (node.first_line, node.first_col), 'type')
         ]
@@ -1459,6 +1993,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
 
     @visit_all
     def visit_TypeVar(self, node):
+        if not self.aux:
+            return
         node.op_pos = []
         last, first = self.names[node.name].find_next((node.first_line, node.first_col))
         node.name_node = NodeWithPosition(last, first, '<name>')
@@ -1475,8 +2011,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_ParamSpec(self, node):
         position = (node.first_line, node.first_col)
         last, first = self.operators['**'].find_next(position)
-        node.op_pos = [NodeWithPosition(last, first, '**')]
         node.uid = last
+        if not self.aux:
+            return
+        node.op_pos = [NodeWithPosition(last, first, '**')]
         last, first = self.names[node.name].find_next(last)
         node.name_node = NodeWithPosition(last, first, '<name>')
         if ge_python313 and node.default_value:
@@ -1487,8 +2025,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
     def visit_TypeVarTuple(self, node):
         position = (node.first_line, node.first_col)
         last, first = self.operators['*'].find_next(position)
-        node.op_pos = [NodeWithPosition(last, first, '*')]
         node.uid = last
+        if not self.aux:
+            return
+        node.op_pos = [NodeWithPosition(last, first, '*')]
         last, first = self.names[node.name].find_next(last)
         node.name_node = NodeWithPosition(last, first, '<name>')
         if ge_python313 and node.default_value:
@@ -1496,6 +2036,8 @@ class LineProvenanceVisitor(ast.NodeVisitor):
             node.op_pos.append(NodeWithPosition(last, first, '='))
 
     def visit(self, node):
+        if self.deadline is not None:
+            self.check_deadline()
         if hasattr(node, 'lineno'):
             node.first_line = node.lineno
         if hasattr(node, 'end_lineno'):
@@ -1504,6 +2046,10 @@ class LineProvenanceVisitor(ast.NodeVisitor):
             node.first_col = node.col_offset
         if hasattr(node, 'end_col_offset'):
             node.last_col = node.end_col_offset
-        super(LineProvenanceVisitor, self).visit(node)
+        try:
+            super(LineProvenanceVisitor, self).visit(node)
+        except BudgetExceeded:
+            self.interrupted.append(node)
+            raise
         if not hasattr(node, 'uid') and hasattr(node, 'first_line') and hasattr(node, 'first_col'):
             node.uid = (node.first_line, node.first_col)
\ No newline at end of file
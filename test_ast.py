@@ -6,7 +6,8 @@ from __future__ import (absolute_import, division)
 
 import unittest
 
-from tests import TestExpr, TestMisc, TestStmt, TestMod, TestExtra
+from tests import TestExpr, TestMisc, TestStmt, TestMod, TestExtra, TestParser
+from tests import TestSerialization, TestIndex, TestServer, TestAio
 
 
 if __name__ == '__main__':
@@ -8,4 +8,12 @@ from .test_expr import TestExpr
 from .test_misc import TestMisc
 from .test_stmt import TestStmt
 from .test_mod import TestMod
-from .test_extra import TestExtra
\ No newline at end of file
+from .test_extra import TestExtra
+from .test_parser import TestParser
+from .test_serialization import TestSerialization
+from .test_index import TestIndex
+from .test_server import TestServer
+try:
+    from .test_aio import TestAio
+except (ImportError, SyntaxError):  # Python 2 has no asyncio
+    TestAio = None
@@ -0,0 +1,117 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+
+from __future__ import (absolute_import, division)
+
+import ast
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .utils import NodeTestCase, crash_visitor
+from pyposast.aio import parse_async, get_nodes_async, parse_files_async
+
+
+class TestAio(NodeTestCase):
+    # pylint: disable=missing-docstring
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_parse_async(self):
+        code = ("#bla\n"
+                "a = b + 1")
+        tree = self.run_async(parse_async(code))
+        self.assertPosition(tree.body[0].value, (2, 4), (2, 9), (2, 7))
+
+    def test_get_nodes_async_process(self):
+        code = ("#bla\n"
+                "a = b + 1")
+        with ProcessPoolExecutor(1) as executor:
+            nodes = self.run_async(
+                get_nodes_async(code, ast.BinOp, executor=executor)
+            )
+        self.assertPosition(nodes[0], (2, 4), (2, 9), (2, 7))
+        self.assertEqual(nodes[0].op_pos[0].kind, '+')
+
+    def test_cancel(self):
+        release = threading.Event()
+        executor = ThreadPoolExecutor(1)
+        executor.submit(release.wait)
+
+        async def cancel():
+            task = asyncio.ensure_future(
+                parse_async("a = 1", executor=executor)
+            )
+            await asyncio.sleep(0.01)
+            task.cancel()
+            release.set()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        try:
+            self.assertTrue(self.run_async(cancel()))
+        finally:
+            release.set()
+            executor.shutdown()
+
+    def test_parse_files_async(self):
+        directory = tempfile.mkdtemp()
+        paths = []
+        for index, code in enumerate(["#bla\na = b + 1\n", "a = (\n"] * 3):
+            paths.append(os.path.join(directory, "{}.py".format(index)))
+            with open(paths[-1], 'w') as output:
+                output.write(code)
+
+        async def collect():
+            result = {}
+            async for path, tree, error in parse_files_async(
+                    paths, concurrency=2):
+                result[path] = tree, error
+            return result
+
+        try:
+            result = self.run_async(collect())
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(sorted(result), sorted(paths))
+        for index, path in enumerate(paths):
+            tree, error = result[path]
+            if index % 2:
+                self.assertIsNone(tree)
+                self.assertIsInstance(error, SyntaxError)
+            else:
+                self.assertIsNone(error)
+                self.assertPosition(
+                    tree.body[0].value, (2, 4), (2, 9), (2, 7)
+                )
+
+    def test_parse_files_async_visitor_error(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "a.py")
+        with open(path, 'w') as output:
+            output.write("del x\n")
+
+        async def collect():
+            return [item async for item in parse_files_async([path])]
+
+        try:
+            with crash_visitor('visit_Delete'):
+                result = self.run_async(collect())
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0][:2], (path, None))
+        self.assertIsInstance(result[0][2], RuntimeError)
@@ -8,10 +8,11 @@ from __future__ import (absolute_import, division)
 import ast
 
 from .utils import NodeTestCase
-from pyposast import get_nodes
+from pyposast import get_nodes, parse
 from pyposast.cross_version import only_python2, only_python3, ge_python35
 from pyposast.cross_version import ge_python36, ge_python38, between_python3_and_38
 from pyposast.cross_version import lt_python312, between_python36_and_311
+from pyposast.cross_version import ge_python39, ge_python310
 
 
 def nprint(nodes):
@@ -59,6 +60,17 @@ class TestExpr(NodeTestCase):
         self.assertPosition(nodes[0], (2, 0), (3, 2), (3, 2))
         self.assertSimpleInnerPosition(nodes[0], (2, 2), (3, 0))
 
+    def test_name6(self):
+        code = ("#bla\n"
+                "( (z) ,\n"
+                " (y # comment\n"
+                "))")
+        nodes = get_nodes(code, ast.Name)
+        self.assertPosition(nodes[0], (2, 2), (2, 5), (2, 5))
+        self.assertSimpleInnerPosition(nodes[0], (2, 3), (2, 4))
+        self.assertPosition(nodes[1], (3, 2), (3, 3), (3, 3))
+        self.assertNoBeforeInnerAfter(nodes[1])
+
     def test_num(self):
         code = ("#bla\n"
                 "12")
@@ -371,6 +383,21 @@ class TestExpr(NodeTestCase):
         self.assertOperation(nodes[0].op_pos[2], (3, 4), (3, 5), (3, 5), ',')
         self.assertSimpleInnerPosition(nodes[0], (2, 1), (5, 1))
 
+    def test_list4(self):
+        code = ("#bla\n"
+                "[1,  # one\n"
+                " 'a'\n"
+                " , (2), 3,\n"
+                "]")
+        nodes = get_nodes(code, ast.List)
+        self.assertPosition(nodes[0], (2, 0), (5, 1), (5, 1))
+        self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 3), (2, 3), ',')
+        self.assertOperation(nodes[0].op_pos[1], (4, 1), (4, 2), (4, 2), ',')
+        self.assertOperation(nodes[0].op_pos[2], (4, 6), (4, 7), (4, 7), ',')
+        self.assertOperation(nodes[0].op_pos[3], (4, 9), (4, 10), (4, 10), ',')
+        self.assertPosition(nodes[0].elts[1], (3, 1), (3, 4), (3, 4))
+        self.assertPosition(nodes[0].elts[2], (4, 3), (4, 6), (4, 6))
+
     @only_python2
     def test_repr(self):
         code = ("#bla\n"
@@ -706,6 +733,19 @@ class TestExpr(NodeTestCase):
         self.assertOperation(nodes[0].op_pos[4], (4, 3), (4, 4), (4, 4), ':')
         self.assertSimpleInnerPosition(nodes[0], (2, 6), (4, 7))
 
+    def test_dict4(self):
+        code = ("#bla\n"
+                "{1: 'a',\n"
+                " 2 :\n"
+                " 'b', }")
+        nodes = get_nodes(code, ast.Dict)
+        self.assertPosition(nodes[0], (2, 0), (4, 7), (4, 7))
+        self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 3), (2, 3), ':')
+        self.assertOperation(nodes[0].op_pos[1], (2, 7), (2, 8), (2, 8), ',')
+        self.assertOperation(nodes[0].op_pos[2], (3, 3), (3, 4), (3, 4), ':')
+        self.assertOperation(nodes[0].op_pos[3], (4, 4), (4, 5), (4, 5), ',')
+        self.assertPosition(nodes[0].values[1], (4, 1), (4, 4), (4, 4))
+
     def test_if_exp(self):
         code = ("#bla\n"
                 "1 if 2\\\n"
@@ -800,6 +840,17 @@ class TestExpr(NodeTestCase):
         self.assertOperation(nodes[0].op_pos[0], (2, 3), (2, 4), (2, 4), '+')
         self.assertSimpleInnerPosition(nodes[0], (2, 1), (2, 6))
 
+    def test_binop_chain(self):
+        code = ("#bla\n" +
+                " + ".join(["a"] * 1500))
+        tree = parse(code)
+        nodes = [node for node in ast.walk(tree) if isinstance(node, ast.BinOp)]
+        self.assertEqual(len(nodes), 1499)
+        self.assertPosition(nodes[0], (2, 0), (2, 5997), (2, 5995))
+        self.assertOperation(nodes[0].op_pos[0], (2, 5994), (2, 5995), (2, 5995), '+')
+        self.assertPosition(nodes[-1], (2, 0), (2, 5), (2, 3))
+        self.assertPosition(nodes[-1].right, (2, 4), (2, 5), (2, 5))
+
     def test_bool_op(self):
         code = ("#bla\n"
                 "a and b and c")
@@ -1062,6 +1113,36 @@ class TestExpr(NodeTestCase):
         self.assertPosition(nodes[0], (4, 9), (4, 31), (4, 31))
         self.assertNoBeforeInnerAfter(nodes[0])
 
+    @ge_python39
+    def test_formatted_value4(self):
+        code = ("#bla\n"
+                "a = 1\n"
+                "d = rf'{{a}} {a!r:>{a}} {{'\n")
+        nodes = get_nodes(code, ast.FormattedValue)
+        names = get_nodes(code, ast.Name)
+        self.assertPosition(nodes[0], (3, 13), (3, 23), (3, 23))
+        self.assertNoBeforeInnerAfter(nodes[0])
+        self.assertPosition(names[2], (3, 14), (3, 15), (3, 15))
+        self.assertPosition(names[3], (3, 20), (3, 21), (3, 21))
+
+    @ge_python310
+    def test_formatted_value5(self):
+        code = ("#bla\n"
+                "a = 1\n"
+                "d = f'''x\n"
+                "  {a\n"
+                " + a}\n"
+                " {[a,\n"
+                " a]}'''\n")
+        nodes = get_nodes(code, ast.FormattedValue)
+        names = get_nodes(code, ast.Name)
+        self.assertPosition(nodes[0], (4, 2), (5, 5), (5, 5))
+        self.assertPosition(nodes[1], (6, 1), (7, 4), (7, 4))
+        self.assertPosition(names[2], (4, 3), (4, 4), (4, 4))
+        self.assertPosition(names[3], (5, 3), (5, 4), (5, 4))
+        self.assertPosition(names[4], (6, 3), (6, 4), (6, 4))
+        self.assertPosition(names[5], (7, 1), (7, 2), (7, 2))
+
     @between_python36_and_311
     def test_constant(self):
         code = ("#bla\n"
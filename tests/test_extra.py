@@ -5,10 +5,19 @@
 from __future__ import (absolute_import, division)
 
 import ast
+import json
+import os
+import shutil
+import tempfile
 import textwrap
+import threading
 
-from .utils import NodeTestCase
-from pyposast import get_nodes
+from .utils import NodeTestCase, crash_visitor
+from pyposast import get_nodes, positions, parse_file, parse, parse_notebook
+from pyposast import notebook_cells
+from pyposast import dump, load
+from pyposast.cross_version import only_python2, only_python3, ge_python38
+from pyposast.visitor import LineProvenanceVisitor
 
 
 class TestExtra(NodeTestCase):
@@ -74,6 +83,364 @@ class TestExtra(NodeTestCase):
         nodes = get_nodes(code, ast.List)
         self.assertPosition(nodes[0], (27, 4), (27, 13), (27, 13))
 
+    def test_node_ids(self):
+        code = ("#bla\n"
+                "a = b + c\n"
+                "d = -a\n")
+        visitor = LineProvenanceVisitor(code, "__main__")
+        nodes = visitor.nodes
+        self.assertEqual(
+            [type(node).__name__ for node in nodes],
+            ['Module', 'Assign', 'Name', 'BinOp', 'Name', 'Name',
+             'Assign', 'Name', 'UnaryOp', 'Name']
+        )
+        for index, node in enumerate(nodes):
+            self.assertEqual(node.node_id, index)
+        self.assertFalse(hasattr(nodes[3].op, 'node_id'))
+        other = LineProvenanceVisitor(code, "__main__").nodes
+        self.assertEqual(
+            [(node.node_id, node.uid) for node in nodes],
+            [(node.node_id, node.uid) for node in other]
+        )
+
+    def test_parse_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            files = {
+                'latin.py': b"# -*- coding: latin-1 -*-\nx = '\xe9' + a\n",
+                'bom.py': b"\xef\xbb\xbfx = '\xc3\xa9' + a",
+                'crlf.py': b"#bla\r\nx = '\xc3\xa9' + a\r\n",
+                'empty.py': b"",
+            }
+            trees = {}
+            for name, data in files.items():
+                path = os.path.join(directory, name)
+                with open(path, 'wb') as output:
+                    output.write(data)
+                trees[name] = parse_file(path)
+        finally:
+            shutil.rmtree(directory)
+        if only_python3:
+            # Python 2 str literals are bytes
+            self.assertEqual(
+                ast.literal_eval(trees['latin.py'].body[0].value.left),
+                u'\xe9'
+            )
+        for name in ('latin.py', 'bom.py', 'crlf.py'):
+            binop = trees[name].body[0].value
+            line = 1 if name == 'bom.py' else 2
+            # Without a coding cookie or BOM, Python 2 counts bytes
+            wide = int(bool(only_python2) and name == 'crlf.py')
+            self.assertPosition(
+                binop, (line, 4), (line, 11 + wide), (line, 9 + wide))
+        self.assertEqual(trees['empty.py'].body, [])
+
+    @ge_python38
+    def test_budget(self):
+        code = ("#bla\n"
+                "x = '\xe9' + (a + b)\n"
+                "def f(a):\n"
+                "    return [i for i in a]\n")
+        for kwargs in ({'node_limit': 5}, {'time_limit': 0}):
+            visitor = LineProvenanceVisitor(code, '<unknown>', **kwargs)
+            tree = visitor.tree
+            self.assertEqual(tree.degraded, visitor.degraded)
+            binop = tree.body[0].value
+            self.assertPosition(binop, (2, 4), (2, 17), (2, 17))
+            self.assertPosition(binop.right, (2, 11), (2, 16), (2, 16))
+            self.assertFalse(hasattr(binop, 'op_pos'))
+            self.assertPosition(tree.body[1].args, (3, 6), (3, 7), (3, 7))
+            self.assertPosition(tree, (2, 0), (4, 25), (4, 25))
+        self.assertEqual(visitor.degraded, 'time limit')
+        visitor = LineProvenanceVisitor(code, '<unknown>', node_limit=100)
+        self.assertIsNone(visitor.degraded)
+        self.assertFalse(hasattr(visitor.tree, 'degraded'))
+        table = positions(code, node_limit=5)
+        self.assertEqual(table.degraded, 'node limit')
+
+    def test_line_ranges(self):
+        code = ("#bla\n"
+                "x = '\xe9' + (a + b)\n"
+                "@dec\n"
+                "def f(a):\n"
+                "    return a + 1\n"
+                "y = 1; z = [\n"
+                "    2]\n")
+        full = get_nodes(code, ast.BinOp)
+        for ranges, selected in (([(3, 3)], (2,)), ([(1, 2), (7, 9)], (0, 1))):
+            binops = get_nodes(code, ast.BinOp, line_ranges=ranges)
+            for index, (binop, expected) in enumerate(zip(binops, full)):
+                if index in selected:
+                    self.assertEqual(set(binop.__dict__),
+                                     set(expected.__dict__))
+                    self.assertPosition(
+                        binop, (expected.first_line, expected.first_col),
+                        (expected.last_line, expected.last_col), expected.uid
+                    )
+                else:
+                    self.assertFalse(hasattr(binop, 'op_pos'))
+        tree = parse(code, line_ranges=[(2, 2)])
+        self.assertFalse(hasattr(tree, 'degraded'))
+        if ge_python38:
+            # Statements out of the ranges have CPython end positions
+            self.assertPosition(binops[2], (5, 11), (5, 16), (5, 16))
+            self.assertPosition(tree.body[1], (4, 0), (5, 16), (5, 16))
+            self.assertPosition(tree.body[3].value, (6, 11), (7, 6), (7, 6))
+            self.assertPosition(tree, (2, 0), (7, 6), (7, 6))
+        tree = parse(code, line_ranges=[(6, 6)])
+        self.assertTrue(hasattr(tree.body[2], 'op_pos'))
+        self.assertTrue(hasattr(tree.body[3], 'op_pos'))
+        self.assertFalse(hasattr(tree.body[0], 'op_pos'))
+
+    def test_statement_last_lines(self):
+        code = ("x = (1,\n"
+                "     2); y = 3\n"
+                "@dec\n"
+                "def f():\n"
+                "    pass\n"
+                "z = 1\n")
+        visitor = LineProvenanceVisitor(code, '<unknown>')
+        self.assertEqual(
+            visitor.statement_last_lines(visitor.tree.body, [1, 2, 3, 6]),
+            [2, 2, 5, 7]
+        )
+
+    def test_start(self):
+        code = ("a + b\n"
+                "def f(x,\n"
+                "      y): pass")
+        tree = parse(code, start=(5, 8))
+        binop = tree.body[0].value
+        self.assertPosition(binop, (5, 8), (5, 13), (5, 11))
+        self.assertEqual(binop.op_pos[0].first_col, 10)
+        self.assertEqual((binop.lineno, binop.col_offset), (5, 8))
+        function = tree.body[1]
+        self.assertPosition(function, (6, 0), (7, 14), (6, 3))
+        self.assertEqual(function.args.args[1].first_line, 7)
+        self.assertPosition(tree, (5, 8), (7, 14), (7, 14))
+        table = positions(code, tree=ast.parse(code), start=(5, 8))
+        self.assertEqual(table[2]['first_col'], 8)
+
+    def test_parse_notebook(self):
+        notebook = {'nbformat': 4, 'cells': [
+            {'cell_type': 'markdown', 'source': ['# Title']},
+            {'cell_type': 'code', 'source': ['%matplotlib inline\n',
+                                             'x = a + 1']},
+            {'cell_type': 'code', 'source': 'y = (\n'},
+            {'cell_type': 'code', 'source': ['  !ls\n', 'y = x + 2\n']},
+            {'cell_type': 'code', 'source': "del z\n"},
+        ]}
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'notebook.ipynb')
+            with open(path, 'w') as output:
+                json.dump(notebook, output)
+            with crash_visitor('visit_Delete'):
+                result = parse_notebook(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([index for index, _, _ in result], [1, 2, 3, 4])
+        self.assertIsNone(result[0][2])
+        self.assertPosition(result[0][1].body[0].value, (2, 4), (2, 9), (2, 7))
+        self.assertIsNone(result[1][1])
+        self.assertIsInstance(result[1][2], SyntaxError)
+        self.assertPosition(result[2][1].body[0].value, (2, 4), (2, 9), (2, 7))
+        self.assertIsNone(result[3][1])
+        self.assertIsInstance(result[3][2], RuntimeError)
+
+    def test_notebook_cells(self):
+        sources = [
+            "x = (a\n     % b)\ny = (a\n    != b)\n",
+            "s = '''\n%not magic\n!neither\n'''\n!ls\n",
+            "x = !ls -la\ny = %time f()\nif x:\n    !echo it's\n    %%bash\n",
+        ]
+        notebook = {'cells': [
+            {'cell_type': 'code', 'source': source} for source in sources
+        ]}
+        self.assertEqual([code for _, code in notebook_cells(notebook)], [
+            "x = (a\n     % b)\ny = (a\n    != b)\n",
+            "s = '''\n%not magic\n!neither\n'''\n#ls\n",
+            "x = None #ls -la\ny = None #time f()\nif x:\n"
+            "    #echo it's\n    #%bash\n",
+        ])
+
+    @only_python3
+    def test_threads(self):
+        code = textwrap.dedent("""
+            import os
+            x = [a + 1 for a in range(3)]
+            def f(a, *args, b=1, **kwargs):
+                return f(a, b=b) if a else (a, b)
+            class A(object):
+                y = lambda self: self.x[1:2]
+            for i in x:
+                print(i, end='')
+            """)
+        expected = dump(parse(code))
+        for threads in (2, 3, 8):
+            visitor = LineProvenanceVisitor(code, '<unknown>', threads=threads)
+            self.assertEqual(dump(visitor.tree), expected)
+
+    @ge_python38
+    def test_threads_type_comments(self):
+        code = "import os\nx = 1  # type: ignore\n"
+        expected = parse(code, type_comments=True)
+        tree = parse(code, type_comments=True, threads=2)
+        self.assertPosition(tree.type_ignores[0], (2, 9), (2, 21), (2, 21))
+        self.assertEqual(dump(tree), dump(expected))
+
+    @only_python3
+    def test_detail(self):
+        code = textwrap.dedent("""
+            import os as o
+            x = y = [a + 1 for a in range(3) if a]
+            @dec
+            def f(a, *args, b=1, **kwargs):
+                return f(a, b=b).c if a < 1 else (a, b)
+            with open(x) as y:
+                x += {1: 2, 'a': x[1:2]}
+            """)
+
+        def positions(tree):
+            return [
+                (n.first_line, n.first_col, n.last_line, n.last_col,
+                 getattr(n, 'uid', None))
+                for n in ast.walk(tree) if hasattr(n, 'first_line')
+            ]
+
+        def extra(tree):
+            position = {'first_line', 'first_col', 'last_line', 'last_col',
+                        'uid', 'node_id'}
+            return sorted({
+                name for n in ast.walk(tree) for name in n.__dict__
+                if name not in position and name not in n._fields
+                and name not in n._attributes
+            })
+        full = parse(code)
+        uid = parse(code, detail='uid')
+        extents = parse(code, detail='extents')
+        self.assertEqual(positions(uid), positions(full))
+        self.assertEqual(
+            [position[:4] + (None,) for position in positions(full)],
+            positions(extents)
+        )
+        self.assertEqual(extra(full), [
+            'arg_order', 'children', 'kwarg_node', 'name_node', 'op_pos',
+            'pos_after', 'pos_before', 'pos_inner', 'vararg_node',
+        ])
+        self.assertEqual(extra(uid), [])
+        self.assertEqual(extra(extents), [])
+        self.assertEqual(
+            dump(load(dump(extents), code)), dump(extents)
+        )
+        self.assertFalse(hasattr(load(dump(extents), code).body[0], 'uid'))
+        with self.assertRaises(ValueError):
+            parse(code, detail='none')
+
+    def test_node_index(self):
+        code = ("#bla\n"
+                "a = b + c\n"
+                "f(a)\n")
+        tree = parse(code, node_index=True)
+        index = tree.node_index
+        assign, expr = tree.body
+        self.assertEqual(index.nodes_at((2, 7)), [assign.value])
+        self.assertEqual(index.nodes_at([2, 9]), [assign, assign.value.right])
+        self.assertEqual(index.nodes_at((9, 9)), [])
+        self.assertIs(index.node_at((2, 4), (2, 9)), assign.value)
+        self.assertIs(index.node_at((3, 0), (3, 4)), expr)
+        self.assertIs(index.node_at((3, 2), (3, 3)), expr.value.args[0])
+        self.assertIs(index.node_at((2, 0), (2, 1)), assign.targets[0])
+        self.assertIsNone(index.node_at((2, 1), (2, 2)))
+        self.assertFalse(hasattr(parse(code), 'node_index'))
+        self.assertEqual(dump(tree), dump(parse(code)))
+        table = positions(code, tree=ast.parse(code), node_index=True)
+        self.assertIs(
+            table.node_index.node_at((2, 4), (2, 9)), table.tree.body[0].value
+        )
+
+    def test_comments(self):
+        code = ("#bla\n"
+                "\n"
+                "# lead 1\n"
+                "# lead 2\n"
+                "def f(a,  # type: int\n"
+                "      b):\n"
+                "    x = g(a)  # trailing\n"
+                "    return [\n"
+                "        # elem\n"
+                "        1,\n"
+                "    ]  # after\n")
+        visitor = LineProvenanceVisitor(code, '<unknown>', comments=True)
+        self.assertEqual(visitor.blank_lines, [2])
+        self.assertEqual(len(visitor.comments), 7)
+        function = visitor.tree.body[0]
+        self.assertEqual(
+            [comment.kind for comment in function.leading_comments],
+            ['# lead 1', '# lead 2']
+        )
+        self.assertPosition(
+            function.args.args[0].trailing_comment, (5, 10), (5, 21), (5, 21)
+        )
+        assign, ret = function.body
+        self.assertEqual(assign.trailing_comment.kind, '# trailing')
+        self.assertEqual(ret.trailing_comment.kind, '# after')
+        self.assertEqual(
+            ret.value.elts[0].leading_comments[0].kind, '# elem'
+        )
+        self.assertFalse(hasattr(function, 'trailing_comment'))
+        self.assertFalse(hasattr(visitor.tree, 'leading_comments'))
+        tree = parse(code, comments=True, start=(3, 0))
+        self.assertPosition(
+            tree.body[0].body[0].trailing_comment, (9, 14), (9, 24), (9, 24)
+        )
+        self.assertFalse(hasattr(parse(code).body[0], 'leading_comments'))
+
+    def test_side_table(self):
+        code = ("#bla\n"
+                "@dec\n"
+                "class A(B):\n"
+                "    x = f(a, b=(1))\n")
+        tree = ast.parse(code)
+        before = ast.dump(tree, include_attributes=True)
+        table = positions(code, tree=tree)
+        self.assertEqual(ast.dump(tree, include_attributes=True), before)
+        self.assertFalse(hasattr(tree.body[0], 'first_line'))
+        self.assertIs(table.tree, tree)
+        self.assertIs(table.nodes[1], tree.body[0])
+        self.assertEqual(table.node_id(tree.body[0]), 1)
+        cls = table[tree.body[0]]
+        self.assertEqual((cls['first_line'], cls['first_col']), (2, 0))
+        self.assertEqual(cls['uid'], (3, 5))
+        call = tree.body[0].body[0].value
+        self.assertIs(table[call]['arg_order'][1][1], call.keywords[0])
+        keyword = table[call.keywords[0].value]
+        self.assertEqual(keyword['uid'], (4, 18))
+        self.assertEqual(keyword['pos_inner'].uid, (4, 17))
+
+    def test_side_table_threads(self):
+        code = "\n".join("a{0} = f(b, c={0}) + [d]".format(i) for i in range(50))
+        tree = ast.parse(code)
+        expected = positions(code, tree=tree).positions
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(positions(code, tree=tree))
+            ) for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 4)
+        for table in results:
+            self.assertEqual(
+                [(x['first_line'], x['first_col'], x['uid'])
+                 for x in table.positions],
+                [(x['first_line'], x['first_col'], x['uid'])
+                 for x in expected]
+            )
+
     def test_update_parenthesis(self):
         code = ("patterns('',\n"
                 "    # url(r'^$', 'views.home', name='home')\n"
@@ -0,0 +1,194 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+
+from __future__ import (absolute_import, division)
+
+import os
+import sys
+import unittest
+
+from .utils import DirectoryTestCase, crash_visitor
+from pyposast import index as index_module
+from pyposast import load
+from pyposast.cross_version import StringIO, ge_python38
+from pyposast.index import Index, annotate_file
+from pyposast.__main__ import main
+
+
+@unittest.skipUnless(sys.version_info >= (3, 0), "concurrent.futures")
+class TestIndex(DirectoryTestCase):
+    # pylint: disable=missing-docstring
+
+    def setUp(self):
+        super(TestIndex, self).setUp()
+        self.database = os.path.join(self.directory, 'index.sqlite')
+        self.write('a.py', "x = 1\n")
+        self.write(os.path.join('pkg', 'b.py'), "def f(a):\n    return a\n")
+
+    def update(self, jobs=1):
+        index = Index(self.database)
+        try:
+            return index.update([self.directory], jobs=jobs)
+        finally:
+            index.close()
+
+    def query(self, sql, *args):
+        index = Index(self.database)
+        try:
+            return index.connection.execute(sql, args).fetchall()
+        finally:
+            index.close()
+
+    @ge_python38
+    def test_update(self):
+        self.assertEqual(self.update(), {
+            'indexed': 2, 'unchanged': 0, 'removed': 0, 'errors': 0,
+            'degraded': 0})
+        path = os.path.join(self.directory, 'a.py')
+        self.assertEqual(self.query(
+            "SELECT node_id, type, first_line, first_col, last_line, "
+            "last_col FROM nodes WHERE path = ? ORDER BY node_id", path
+        ), [
+            (0, 'Module', 1, 0, 1, 5),
+            (1, 'Assign', 1, 0, 1, 5),
+            (2, 'Name', 1, 0, 1, 1),
+            (3, 'Constant', 1, 4, 1, 5),
+        ])
+        (positions,), = self.query(
+            "SELECT positions FROM files WHERE path = ?", path)
+        tree = load(positions, "x = 1\n")
+        self.assertEqual(tree.body[0].value.uid, (1, 5))
+
+    def test_update_only_changed(self):
+        self.update()
+        self.write('a.py', "x = 1\n", mtime=1)
+        self.write('c.py', "y = (\n")
+        os.remove(os.path.join(self.directory, 'pkg', 'b.py'))
+        self.assertEqual(self.update(), {
+            'indexed': 1, 'unchanged': 1, 'removed': 1, 'errors': 1,
+            'degraded': 0})
+        self.assertEqual(len(self.query("SELECT * FROM files")), 2)
+        self.assertEqual(self.query(
+            "SELECT mtime FROM files WHERE path = ?",
+            os.path.join(self.directory, 'a.py')
+        ), [(1,)])
+
+    def test_update_visitor_error(self):
+        self.write('c.py', "del x\n")
+        with crash_visitor('visit_Delete'):
+            summary = self.update()
+        self.assertEqual(summary, {
+            'indexed': 3, 'unchanged': 0, 'removed': 0, 'errors': 1,
+            'degraded': 0})
+        (error,), = self.query(
+            "SELECT error FROM files WHERE path = ?",
+            os.path.join(self.directory, 'c.py'))
+        self.assertIn('RuntimeError', error)
+
+    @ge_python38
+    def test_update_node_limit(self):
+        index = Index(self.database)
+        try:
+            summary = index.update([self.directory], jobs=1, node_limit=5)
+            self.assertEqual(summary['degraded'], 1)
+            self.assertEqual(index.degraded(), [
+                (os.path.join(self.directory, 'pkg', 'b.py'), 'node limit')
+            ])
+        finally:
+            index.close()
+        self.assertEqual(self.query(
+            "SELECT type, first_line, first_col, last_line, last_col "
+            "FROM nodes WHERE type = 'Return'"
+        ), [('Return', 2, 4, 2, 12)])
+
+    def test_update_duplicates(self):
+        for name in ('c.py', 'd.py'):
+            self.write(name, "def f(a):\n    return a\n")
+            self.write('e' + name, "y = (\n")
+        calls = []
+
+        def annotate(*args, **kwargs):
+            calls.append(args)
+            return annotate_file(*args, **kwargs)
+
+        index_module.annotate_file = annotate
+        try:
+            summary = self.update()
+        finally:
+            index_module.annotate_file = annotate_file
+        self.assertEqual(summary, {
+            'indexed': 6, 'unchanged': 0, 'removed': 0, 'errors': 2,
+            'degraded': 0})
+        # b.py, c.py and d.py share the content. Failures are annotated again
+        self.assertEqual(len(calls), 4)
+        rows = {}
+        for name in ('pkg/b.py', 'c.py', 'd.py'):
+            path = os.path.join(self.directory, *name.split('/'))
+            rows[name] = self.query(
+                "SELECT node_id, type, first_line, first_col, last_line, "
+                "last_col, uid_line, uid_col FROM nodes WHERE path = ?", path
+            )
+        self.assertEqual(len(rows['c.py']), 6)
+        self.assertEqual(rows['pkg/b.py'], rows['c.py'])
+        self.assertEqual(rows['pkg/b.py'], rows['d.py'])
+        errors = self.query("SELECT path, error FROM files "
+                            "WHERE error IS NOT NULL ORDER BY path")
+        for path, error in errors:
+            self.assertIn(repr(path), error)
+
+    def test_occurrences(self):
+        self.write('c.py', "def g(a):\n    return f(a) + a.a\n")
+        index = Index(self.database)
+        try:
+            index.update([self.directory], jobs=1, node_limit=5)
+            # Degraded files are tokenized for the names
+            path = os.path.join(self.directory, 'c.py')
+            other = os.path.join(self.directory, 'pkg', 'b.py')
+            self.assertEqual(index.occurrences('a'), [
+                (path, (1, 6), (1, 7)),
+                (path, (2, 13), (2, 14)),
+                (path, (2, 18), (2, 19)),
+                (path, (2, 20), (2, 21)),
+                (other, (1, 6), (1, 7)),
+                (other, (2, 11), (2, 12)),
+            ])
+            self.assertEqual(index.occurrences('return'), [])
+            os.remove(path)
+            index.update([self.directory], jobs=1)
+            self.assertEqual(index.occurrences('g'), [])
+        finally:
+            index.close()
+
+    def test_occurrences_time_limit(self):
+        index = Index(self.database)
+        try:
+            summary = index.update([self.directory], jobs=1, time_limit=0)
+            self.assertEqual(summary['degraded'], 2)
+            self.assertEqual(index.occurrences('a'), [])
+        finally:
+            index.close()
+
+    def test_names_table_added(self):
+        self.update()
+        self.query("DROP TABLE names")
+        self.assertEqual(self.update()['indexed'], 2)
+        self.assertEqual(len(self.query(
+            "SELECT * FROM names WHERE name = 'a'")), 2)
+
+    def test_main_find(self):
+        main([self.directory, '-o', self.database, '-j', '1', '-q'])
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            self.assertEqual(main(['--find', 'f', '-o', self.database]), 0)
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(output.getvalue(), '{}:1:4\n'.format(
+            os.path.join(self.directory, 'pkg', 'b.py')))
+
+    def test_main(self):
+        self.assertEqual(main([
+            self.directory, '-o', self.database, '-j', '2', '-q'
+        ]), 0)
+        self.assertEqual(len(self.query("SELECT * FROM files")), 2)
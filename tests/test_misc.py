@@ -198,6 +198,15 @@ class TestMisc(NodeTestCase):
         self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 3), (2, 3), ':')
         self.assertNoBeforeInnerAfter(nodes[0])
 
+    def test_slice13(self):
+        code = ("#bla\n"
+                "a[:1]\n"
+                "b[2:3]")
+        nodes = get_nodes(code, ast.Slice)
+        self.assertPosition(nodes[0], (2, 2), (2, 4), (2, 3))
+        self.assertEqual(len(nodes[0].op_pos), 1)
+        self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 3), (2, 3), ':')
+
     def test_eq(self):
         code = ("#bla\n"
                 "2 == 4")
@@ -0,0 +1,67 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+
+from __future__ import (absolute_import, division)
+
+import ast
+
+from .utils import NodeTestCase
+from pyposast import get_nodes
+from pyposast.cross_version import ge_python38
+from pyposast.parser import ElementDict, fstring_fields
+
+
+class TestParser(NodeTestCase):
+    # pylint: disable=missing-docstring
+
+    def setUp(self):
+        self.elements = ElementDict([
+            ((1, 3), (1, 0)), ((2, 5), (2, 1)), ((4, 2), (4, 0))
+        ])
+
+    def test_get_next_and_previous(self):
+        self.assertEqual(self.elements.get_next((4, 3)), (None, None))
+        self.assertEqual(self.elements.get_previous((1, 3)), (None, None))
+        self.assertEqual(self.elements.get_previous((1, 4)), ((1, 3), (1, 0)))
+
+    def test_lookups_do_not_modify(self):
+        attributes = dict(self.elements.__dict__)
+        self.elements.find_next((2, 0))
+        self.elements.find_previous((2, 0))
+        self.elements.get_next((2, 0))
+        self.elements.last_between((1, 0), (4, 2))
+        self.assertEqual(self.elements.__dict__, attributes)
+        self.elements[(5, 1)] = (5, 0)
+        self.elements.set_keys()
+        self.assertEqual(self.elements.find_next((4, 3)), ((5, 1), (5, 0)))
+        self.assertEqual(
+            self.elements.sorted_keys(), [(1, 3), (2, 5), (4, 2), (5, 1)])
+
+    def test_between(self):
+        self.assertEqual(
+            self.elements.first_between((1, 4), (4, 2)), ((2, 5), (2, 1)))
+        self.assertEqual(
+            self.elements.last_between((1, 0), (4, 2)), ((2, 5), (2, 1)))
+        self.assertEqual(
+            self.elements.first_between((2, 6), (4, 2)), (None, None))
+        self.assertEqual(
+            self.elements.last_between((2, 6), (4, 2)), (None, None))
+
+    @ge_python38
+    def test_leaf_positions(self):
+        code = ("a = [1, 2.5, 'x', b'y',\n"
+                "     'z' 'w', None, 3j]")
+        nodes = get_nodes(code, ast.Constant)
+        self.assertPosition(nodes[0], (1, 5), (1, 6), (1, 6))
+        self.assertPosition(nodes[1], (1, 8), (1, 11), (1, 11))
+        self.assertPosition(nodes[2], (1, 13), (1, 16), (1, 16))
+        self.assertPosition(nodes[3], (1, 18), (1, 22), (1, 22))
+        self.assertPosition(nodes[4], (2, 5), (2, 12), (2, 12))
+        self.assertPosition(nodes[5], (2, 14), (2, 18), (2, 18))
+        self.assertPosition(nodes[6], (2, 20), (2, 22), (2, 22))
+
+    def test_fstring_fields(self):
+        self.assertEqual(fstring_fields("{{a}} {b!r:>{c}} {d != e} {'}'}"), [
+            (6, 15, 8), (12, 14, 14), (17, 24, 24), (26, 30, 30)
+        ])
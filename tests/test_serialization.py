@@ -0,0 +1,76 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+
+from __future__ import (absolute_import, division)
+
+import ast
+import copy
+import pickle
+
+from .utils import NodeTestCase
+from pyposast import parse, dump, load
+from pyposast.cross_version import only_python3
+from pyposast.node_helpers import NodeWithPosition
+from pyposast.utils import preorder
+
+
+class TestSerialization(NodeTestCase):
+    # pylint: disable=missing-docstring
+
+    code = ("#bla\n"
+            "@dec\n"
+            "def f(a, b=1, *args, **kwargs):\n"
+            "    return g(a, *args, x=(b + 1), **kwargs)\n")
+
+    def test_load(self):
+        tree = load(dump(parse(self.code)), self.code)
+        func = tree.body[0]
+        self.assertPosition(func, (2, 0), (4, 43), (3, 3))
+        self.assertOperation(func.op_pos[4], (3, 30), (3, 31), (3, 31), ':')
+        self.assertPosition(func.name_node, (3, 4), (3, 5), (3, 5))
+        self.assertPosition(
+            func.args.vararg_node, (3, 15), (3, 19), (3, 19))
+        if only_python3:
+            self.assertIs(func.args.vararg_node, func.args.vararg)
+        call = func.body[0].value
+        self.assertPosition(call, (4, 11), (4, 43), (4, 43))
+        self.assertIs(call.arg_order[2][1], call.keywords[0])
+        self.assertIs(call.arg_order[1][2], call.op_pos[2])
+        binop = call.keywords[0].value
+        self.assertPosition(binop, (4, 25), (4, 32), (4, 29))
+        self.assertSimpleInnerPosition(binop, (4, 26), (4, 31))
+
+    def test_load_same_attributes(self):
+        tree = parse(self.code)
+        loaded = load(dump(tree), tree=ast.parse(self.code))
+        for original, node in zip(preorder(tree), preorder(loaded)):
+            self.assertEqual(
+                set(original.__dict__) - set(original._fields),
+                set(node.__dict__) - set(node._fields)
+            )
+
+    def test_load_other_code(self):
+        data = dump(parse(self.code))
+        with self.assertRaises(ValueError):
+            load(data, "a = 1\n")
+        with self.assertRaises(ValueError):
+            load(b"XXXX" + data[4:], self.code)
+
+    def test_pickle(self):
+        tree = pickle.loads(pickle.dumps(parse(self.code)))
+        func = tree.body[0]
+        self.assertPosition(func, (2, 0), (4, 43), (3, 3))
+        self.assertOperation(func.op_pos[4], (3, 30), (3, 31), (3, 31), ':')
+        call = func.body[0].value
+        self.assertIs(call.arg_order[1][2], call.op_pos[2])
+        self.assertIs(call.arg_order[2][1], call.keywords[0])
+
+    def test_pickle_position(self):
+        position = NodeWithPosition((1, 5), (1, 2), 'yield from')
+        position.uid = (1, 3)
+        result = copy.deepcopy(position)
+        self.assertOperation(result, (1, 2), (1, 5), (1, 3), 'yield from')
+        self.assertEqual(list(vars(result)), list(vars(position)))
+        position.other = 1
+        self.assertEqual(pickle.loads(pickle.dumps(position)).other, 1)
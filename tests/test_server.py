@@ -0,0 +1,120 @@
+# Copyright (c) 2016 Universidade Federal Fluminense (UFF)
+# This file is part of PyPosAST.
+# Please, consult the license terms in the LICENSE file.
+
+from __future__ import (absolute_import, division)
+
+import os
+import socket
+import sys
+import threading
+import unittest
+
+from .utils import DirectoryTestCase, crash_visitor
+from pyposast.client import Client, ServerError
+from pyposast.cross_version import ge_python38
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unix-domain sockets")
+@unittest.skipUnless(sys.version_info >= (3, 0), "concurrent.futures")
+class TestServer(DirectoryTestCase):
+    # pylint: disable=missing-docstring
+
+    def setUp(self):
+        from pyposast.server import AnnotationServer
+        super(TestServer, self).setUp()
+        self.address = os.path.join(self.directory, 'server.sock')
+        self.server = AnnotationServer(self.address, jobs=1, cache_size=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.client = Client(self.address)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        super(TestServer, self).tearDown()
+
+    def test_nodes(self):
+        path = self.write('a.py', "#bla\nx = a + 1\n")
+        rows = self.client.nodes(path)
+        self.assertEqual(rows[0][:2], [0, 'Module'])
+        self.assertEqual(
+            self.client.nodes(path, 'BinOp'),
+            [[3, 'BinOp', 2, 4, 2, 9, 2, 7]]
+        )
+
+    @ge_python38
+    def test_node_at(self):
+        path = self.write('a.py', "#bla\nx = a + 1\n")
+        self.assertEqual(self.client.node_at(path, 2, 4)[1], 'Name')
+        self.assertEqual(self.client.node_at(path, 2, 6)[1], 'BinOp')
+        self.assertEqual(self.client.node_at(path, 2, 8)[1], 'Constant')
+        self.assertEqual(self.client.node_at(path, 1, 0), None)
+
+    @ge_python38
+    def test_cache(self):
+        path = self.write('a.py', "x = 1\n", mtime=1000)
+        self.client.nodes(path)
+        self.client.nodes(path)
+        self.assertEqual(
+            self.client.stats(), {'files': 1, 'hits': 1, 'misses': 1}
+        )
+        self.write('a.py', "x = 12\n", mtime=2000)
+        self.assertEqual(self.client.nodes(path, 'Constant')[0][5], 6)
+        self.assertEqual(self.client.stats()['misses'], 2)
+
+    def test_cache_size(self):
+        for name in ('a.py', 'b.py', 'c.py'):
+            self.client.nodes(self.write(name, "x = 1\n"))
+        self.assertEqual(self.client.stats()['files'], 2)
+        self.assertEqual(
+            list(self.server.cache), [os.path.join(self.directory, name)
+                                      for name in ('b.py', 'c.py')]
+        )
+
+    def test_errors(self):
+        path = self.write('a.py', "x = (\n")
+        with self.assertRaises(ServerError) as context:
+            self.client.nodes(path)
+        self.assertIn('SyntaxError', str(context.exception))
+        with self.assertRaises(ServerError):
+            self.client.nodes(os.path.join(self.directory, 'missing.py'))
+        with self.assertRaises(ServerError):
+            self.client.request('unknown', path=path)
+        with self.assertRaises(ServerError):
+            self.client.request('nodes')
+        self.assertEqual(self.client.stats()['misses'], 1)
+
+    def test_malformed_request(self):
+        path = self.write('a.py', "x = 1\n")
+        with self.assertRaises(ServerError):
+            self.client.request('node_at', path=path, line=None, col=0)
+        self.assertEqual(len(self.client.nodes(path)), 4)
+
+    def test_visitor_error(self):
+        path = self.write('a.py', "del x\n")
+        with crash_visitor('visit_Delete'):
+            for _ in range(2):
+                with self.assertRaises(ServerError) as context:
+                    self.client.nodes(path)
+                self.assertIn('RuntimeError', str(context.exception))
+        self.assertEqual(
+            self.client.stats(), {'files': 1, 'hits': 1, 'misses': 1}
+        )
+
+    def test_concurrent_clients(self):
+        path = self.write('a.py', "#bla\nx = a + 1\n")
+        results = []
+
+        def request():
+            with Client(self.address) as client:
+                results.append(client.nodes(path, 'BinOp'))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [[[3, 'BinOp', 2, 4, 2, 9, 2, 7]]] * 4)
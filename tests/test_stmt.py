@@ -466,6 +466,33 @@ class TestStmt(NodeTestCase):
         self.assertOperation(nodes[1].op_pos[2], (6, 0), (6, 5), (6, 5), 'else:')
         self.assertNoBeforeInnerAfter(nodes[1])
 
+    def test_if6(self):
+        code = ("#bla\n"
+                "if x:\n"
+                "    a\n"
+                "elif y:\n"
+                "    b\n"
+                "c = 1 if z else 2")
+        nodes = get_nodes(code, ast.If)
+        self.assertPosition(nodes[0], (2, 0), (5, 5), (2, 2))
+        self.assertEqual(len(nodes[0].op_pos), 2)
+        self.assertOperation(nodes[0].op_pos[0], (2, 0), (2, 2), (2, 2), 'if')
+        self.assertOperation(nodes[0].op_pos[1], (2, 4), (2, 5), (2, 5), ':')
+
+    def test_if7(self):
+        code = ("#bla\n"
+                "if x:\n"
+                "    if y:\n"
+                "        a\n"
+                "    else:\n"
+                "        b\n"
+                "elif z:\n"
+                "    c\n")
+        nodes = get_nodes(code, ast.If)
+        self.assertPosition(nodes[0], (2, 0), (8, 5), (2, 2))
+        self.assertEqual(len(nodes[0].op_pos), 2)
+        self.assertOperation(nodes[1].op_pos[2], (5, 4), (5, 9), (5, 9), 'else:')
+
     def test_while(self):
         code = ("#bla\n"
                 "while x:\n"
@@ -638,6 +665,15 @@ class TestStmt(NodeTestCase):
         self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 4), (2, 4), '+=')
         self.assertNoBeforeInnerAfter(nodes[0])
 
+    def test_aug_assign2(self):
+        code = ("#bla\n"
+                "a += b + c")
+        nodes = get_nodes(code, ast.AugAssign)
+        self.assertPosition(nodes[0], (2, 0), (2, 10), (2, 4))
+        self.assertOperation(nodes[0].op_pos[0], (2, 2), (2, 4), (2, 4), '+=')
+        nodes = get_nodes(code, ast.BinOp)
+        self.assertOperation(nodes[0].op_pos[0], (2, 7), (2, 8), (2, 8), '+')
+
     @ge_python36
     def test_ann_assign(self):
         code = ("#bla\n"
@@ -939,6 +975,22 @@ class TestStmt(NodeTestCase):
         self.assertOperation(nodes[0].name_node, (2, 6), (2, 7), (2, 7), '<name>')
         self.assertNoBeforeInnerAfter(nodes[0])
 
+    def test_function_def6(self):
+        code = ("#bla\n"
+                "@a\n"
+                "def f():\n"
+                "    pass\n"
+                "@b\n"
+                "def g():\n"
+                "    pass")
+        nodes = get_nodes(code, ast.FunctionDef)
+        self.assertPosition(nodes[0], (2, 0), (4, 8), (3, 3))
+        self.assertOperation(nodes[0].op_pos[0], (2, 0), (2, 1), (2, 1), '@')
+        self.assertPosition(nodes[1], (5, 0), (7, 8), (6, 3))
+        self.assertOperation(nodes[1].op_pos[0], (5, 0), (5, 1), (5, 1), '@')
+        nodes = get_nodes(code, ast.FunctionDef, line_ranges=[(6, 6)])
+        self.assertPosition(nodes[1], (5, 0), (7, 8), (6, 3))
+
     @ge_python35
     def test_async_function_def1(self):
         code = ("#bla\n"
@@ -6,8 +6,13 @@
 
 from __future__ import (absolute_import, division)
 
+import os
+import shutil
+import tempfile
 import unittest
 
+from contextlib import contextmanager
+
 
 class NodeTestCase(unittest.TestCase):
     """Base test case"""
@@ -52,3 +57,40 @@ class NodeTestCase(unittest.TestCase):
         self.assertPosition(node.pos_before, node_first, first, first)
         self.assertPosition(node.pos_inner, first, last, last)
         self.assertPosition(node.pos_after, last, node_last, node_last)
+
+
+class DirectoryTestCase(unittest.TestCase):
+    """Base test case with a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, code, mtime=None):
+        """Write code to a file of the temporary directory. Return its path"""
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as output:
+            output.write(code)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+
+@contextmanager
+def crash_visitor(name):
+    """Make a visit method of LineProvenanceVisitor raise RuntimeError"""
+    from pyposast.visitor import LineProvenanceVisitor
+    original = LineProvenanceVisitor.__dict__[name]
+
+    def crash(self, node):
+        raise RuntimeError("visitor crash")
+
+    setattr(LineProvenanceVisitor, name, crash)
+    try:
+        yield
+    finally:
+        setattr(LineProvenanceVisitor, name, original)